@@ -1,13 +1,24 @@
 # ─── Imports ────────────────────────────────────────────────────────────────
+import codecs
+import gzip
+import hashlib
+import mimetypes
+import json
 import os
+import re
 import sys
 import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta, timezone
 
 import requests
-from flask import Flask, redirect, request, send_file, send_from_directory
+from flask import Flask, Response, abort, redirect, request, stream_with_context
 import jwt
 from jwt import InvalidTokenError
+from jwt.algorithms import get_default_algorithms
+from werkzeug.security import safe_join
 
 class EntitlementError(RuntimeError):
     pass
@@ -18,15 +29,29 @@ app = Flask(__name__)
 
 @app.after_request
 def no_cache(resp):
-    if resp.mimetype == "text/html":
+    # Static assets set their own validators; everything else is live state
+    if "Cache-Control" not in resp.headers:
         resp.headers["Cache-Control"] = "no-store, max-age=0"
     return resp
 
 # ─── Safe config (no secrets on pod) ────────────────────────────────────────
 GATEWAY = os.environ.get("GATEWAY_URL", "https://auth.maxedout.ai")
 
-with open("/workspace/auth/public.pem", "rb") as f:
-    PUBLIC_JWT_KEY = f.read()
+def load_public_key(path):
+    """Parse the gateway's PEM once into a key object so jwt.decode doesn't re-parse it per call."""
+    with open(path, "rb") as f:
+        pem = f.read()
+    rs256 = get_default_algorithms().get("RS256")
+    if rs256 is None:
+        print("⚠️ RS256 unavailable (is cryptography installed?); JWTs can't be verified")
+        return None
+    try:
+        return rs256.prepare_key(pem)
+    except Exception as e:
+        print(f"⚠️ Couldn't parse public key {path}: {e}")
+        return None
+
+PUBLIC_JWT_KEY = load_public_key("/workspace/auth/public.pem")
 
 # ─── Utilities ──────────────────────────────────────────────────────────────
 def get_env_var(key, required=True, default=None):
@@ -43,36 +68,282 @@ def runpod_callback_url():
     port = get_env_var("RUNPOD_PORT_7860_TCP_PORT", required=False, default="7860")
     return f"https://{pod_id}-{port}.proxy.runpod.net/callback"
 
-def download_via_gateway(bearer_token: str, rel: str, dest_path: str):
+# Shared keep-alive session for gateway pulls; sized for the parallel fan-out in callback().
+GATEWAY_FETCH_WORKERS = 4
+gateway_session = requests.Session()
+gateway_session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=GATEWAY_FETCH_WORKERS))
+
+# ETags of the gated assets we already hold, so a re-unlock can skip unchanged copies.
+GATEWAY_ETAGS = "/workspace/.gateway_etags.json"
+
+def load_gateway_etags():
+    try:
+        with open(GATEWAY_ETAGS) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_gateway_etags(etags):
+    tmp = f"{GATEWAY_ETAGS}.tmp"
+    try:
+        with open(tmp, "w") as f:
+            json.dump(etags, f, indent=1)
+        os.replace(tmp, GATEWAY_ETAGS)
+    except OSError as e:
+        print(f"⚠️ Couldn't save gateway ETags: {e}")
+
+def download_via_gateway(bearer_token: str, rel: str, dest_path: str, etags=None):
     url = f"{GATEWAY}/deliver/{rel}"
     print(f"→ fetching {url} -> {dest_path}")
-    r = requests.get(url, headers={"Authorization": f"Bearer {bearer_token}"}, stream=True, timeout=120)
-    print(f"  status = {r.status_code}")
+    headers = {"Authorization": f"Bearer {bearer_token}"}
+    known = etags.get(dest_path) if etags is not None and os.path.exists(dest_path) else None
+    if known:
+        headers["If-None-Match"] = known
 
-    # 👇 Treat these as entitlement failures
-    if r.status_code in (401, 402, 403):
-        try:
-            print("  body:", r.text[:300])
-        except Exception:
-            pass
-        raise EntitlementError(f"entitlement denied: {r.status_code}")
+    with gateway_session.get(url, headers=headers, stream=True, timeout=120) as r:
+        print(f"  status = {r.status_code}")
 
-    if r.status_code != 200:
+        if r.status_code == 304:
+            print(f"  unchanged, keeping {dest_path}")
+            return
+
+        # 👇 Treat these as entitlement failures
+        if r.status_code in (401, 402, 403):
+            try:
+                print("  body:", r.text[:300])
+            except Exception:
+                pass
+            raise EntitlementError(f"entitlement denied: {r.status_code}")
+
+        if r.status_code != 200:
+            try:
+                print("  body:", r.text[:300])
+            except Exception:
+                pass
+            raise RuntimeError(f"fetch failed: {url} -> {r.status_code}")
+
+        # Write beside the target and rename, so a reader never sees a half-written file
+        os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+        tmp_path = f"{dest_path}.{threading.get_ident()}.tmp"
+        wrote = 0
         try:
-            print("  body:", r.text[:300])
-        except Exception:
-            pass
-        raise RuntimeError(f"fetch failed: {url} -> {r.status_code}")
-
-    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-    wrote = 0
-    with open(dest_path, "wb") as f:
-        for chunk in r.iter_content(1 << 20):
-            if chunk:
-                f.write(chunk)
-                wrote += len(chunk)
+            with open(tmp_path, "wb") as f:
+                for chunk in r.iter_content(1 << 20):
+                    if chunk:
+                        f.write(chunk)
+                        wrote += len(chunk)
+            os.replace(tmp_path, dest_path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    if etags is not None:
+        etag = r.headers.get("ETag")
+        if etag:
+            etags[dest_path] = etag
+        else:
+            etags.pop(dest_path, None)
     print(f"  wrote {wrote} bytes to {dest_path}")
 
+# ─── Unlock state ──────────────────────────────────────────────────────────
+UNLOCK_FILE = "/workspace/.flux_token"
+UNLOCK_TTL = timedelta(hours=24)
+
+class UnlockState:
+    """
+    When this pod was last unlocked and for whom, held in memory and persisted
+    to UNLOCK_FILE. The file is only re-read when its mtime/size changes, so
+    deleting it still forces a fresh unlock.
+    """
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self.unlocked_at = None
+        self.claims = {}
+        self._sig = None
+        self._lock = threading.Lock()
+
+    def _file_sig(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+    def _reload(self, sig):
+        self._sig = sig
+        self.unlocked_at, self.claims = None, {}
+        if sig is None:
+            return
+        try:
+            with open(self.path) as f:
+                raw = f.read().strip()
+            # Older pods wrote a bare ISO timestamp
+            data = json.loads(raw) if raw.startswith("{") else {"unlocked_at": raw}
+            self.unlocked_at = datetime.fromisoformat(data["unlocked_at"])
+            self.claims = data.get("claims", {})
+        except Exception as e:
+            print(f"⚠️ Couldn't parse timestamp: {e}")
+            try:
+                os.remove(self.path)
+            except Exception:
+                pass
+            self._sig = None
+
+    def _refresh(self):
+        sig = self._file_sig()
+        if sig != self._sig:
+            self._reload(sig)
+
+    def is_unlocked(self):
+        with self._lock:
+            self._refresh()
+            return self.unlocked_at is not None and datetime.now(timezone.utc) - self.unlocked_at <= self.ttl
+
+    def mark_unlocked(self, claims):
+        now = datetime.now(timezone.utc)
+        keep = {k: claims[k] for k in ("sub", "pod_id", "exp") if k in claims}
+        tmp = f"{self.path}.tmp"
+        with self._lock:
+            with open(tmp, "w") as f:
+                json.dump({"unlocked_at": now.isoformat(), "claims": keep}, f)
+            os.replace(tmp, self.path)
+            self.unlocked_at, self.claims = now, keep
+            self._sig = self._file_sig()
+
+    def to_dict(self):
+        unlocked = self.is_unlocked()
+        with self._lock:
+            at = self.unlocked_at
+            return {
+                "unlocked": unlocked,
+                "unlocked_at": at.isoformat() if at else None,
+                "expires_at": (at + self.ttl).isoformat() if at else None,
+            }
+
+unlock_state = UnlockState(UNLOCK_FILE, UNLOCK_TTL)
+
+# ─── Metrics ────────────────────────────────────────────────────────────────
+# Written by scripts/install_maxedout.py (see flush_metrics there).
+DOWNLOAD_METRICS = os.environ.get("MXD_METRICS_FILE", "/workspace/logs/mxd_metrics.json")
+CALLBACK_BUCKETS = (0.25, 0.5, 1, 2, 5, 10, 30, 60, 120)
+
+class Histogram:
+    """Minimal cumulative-bucket histogram, rendered in the Prometheus text format."""
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            for i, le in enumerate(self.buckets):
+                if value <= le:
+                    self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def to_dict(self):
+        with self._lock:
+            return {"le": list(self.buckets), "counts": list(self.counts), "sum": self.sum, "count": self.count}
+
+callback_seconds = Histogram(CALLBACK_BUCKETS)
+callback_results = {}
+_callback_results_lock = threading.Lock()
+
+def record_callback(outcome, elapsed):
+    callback_seconds.observe(elapsed)
+    with _callback_results_lock:
+        callback_results[outcome] = callback_results.get(outcome, 0) + 1
+
+def _series_labels(key, value):
+    return f"{key}={json.dumps(str(value), ensure_ascii=False)}"
+
+def _series(name, labels, value):
+    return f"{name}{{{labels}}} {value}" if labels else f"{name} {value}"
+
+def render_metrics(data):
+    """Prometheus text exposition for {"counters", "gauges", "histograms"} as stored by the downloader."""
+    lines = []
+    for kind in ("counters", "gauges"):
+        for name, series in sorted(data.get(kind, {}).items()):
+            lines.append(f"# TYPE {name} {kind[:-1]}")
+            lines.extend(_series(name, labels, value) for labels, value in sorted(series.items()))
+    for name, series in sorted(data.get("histograms", {}).items()):
+        lines.append(f"# TYPE {name} histogram")
+        for labels, hist in sorted(series.items()):
+            sep = "," if labels else ""
+            for le, count in zip(hist["le"], hist["counts"]):
+                lines.append(_series(f"{name}_bucket", f'{labels}{sep}le="{le:g}"', count))
+            lines.append(_series(f"{name}_bucket", f'{labels}{sep}le="+Inf"', hist["count"]))
+            lines.append(_series(f"{name}_sum", labels, hist["sum"]))
+            lines.append(_series(f"{name}_count", labels, hist["count"]))
+    return lines
+
+# ─── Static assets (served from memory) ─────────────────────────────────────
+AUTH_DIR = "/workspace/auth"
+GZIP_MIN_BYTES = 512
+GZIP_TYPES = ("text/", "application/javascript", "application/json", "image/svg+xml")
+
+class StaticAsset:
+    """A file held in memory with its ETag, mtime and gzip variant. Reloaded when the file changes."""
+    def __init__(self, path):
+        self.path = path
+        self.sig = None
+        self._lock = threading.Lock()
+
+    def _load(self, sig):
+        with open(self.path, "rb") as f:
+            data = f.read()
+        self.data = data
+        self.etag = hashlib.sha1(data).hexdigest()[:16]
+        self.last_modified = datetime.fromtimestamp(sig[0] / 1e9, timezone.utc)
+        self.mimetype = mimetypes.guess_type(self.path)[0] or "application/octet-stream"
+        self.gzipped = None
+        if len(data) >= GZIP_MIN_BYTES and self.mimetype.startswith(GZIP_TYPES):
+            self.gzipped = gzip.compress(data, compresslevel=9, mtime=0)
+        self.sig = sig
+
+    def current(self):
+        st = os.stat(self.path)
+        sig = (st.st_mtime_ns, st.st_size)
+        if sig != self.sig:
+            with self._lock:
+                if sig != self.sig:
+                    self._load(sig)
+        return self
+
+_static_assets = {}
+_static_lock = threading.Lock()
+
+def serve_static(path, cache_control="no-cache"):
+    """
+    Serve `path` from memory with ETag/Last-Modified and gzip when the client
+    accepts it. HTML uses `no-cache`, so the browser revalidates every time
+    and gets a 304 when the page is unchanged.
+    """
+    with _static_lock:
+        asset = _static_assets.get(path)
+        if asset is None:
+            asset = _static_assets[path] = StaticAsset(path)
+    asset = asset.current()
+
+    use_gzip = asset.gzipped is not None and "gzip" in request.headers.get("Accept-Encoding", "")
+    resp = Response(asset.gzipped if use_gzip else asset.data, mimetype=asset.mimetype)
+    if use_gzip:
+        resp.headers["Content-Encoding"] = "gzip"
+    if asset.gzipped is not None:
+        resp.headers["Vary"] = "Accept-Encoding"
+    resp.set_etag(asset.etag + ("-gz" if use_gzip else ""))
+    resp.last_modified = asset.last_modified
+    resp.headers["Cache-Control"] = cache_control
+    return resp.make_conditional(request)
+
 # ─── Static pages & 404 ────────────────────────────────────────────────────
 @app.errorhandler(404)
 def not_found(e):
@@ -81,12 +352,12 @@ def not_found(e):
 @app.route("/success")
 def success():
     print("✅ Success page reached.")
-    return send_file("/workspace/auth/success.html")
+    return serve_static(f"{AUTH_DIR}/success.html")
 
 @app.route("/")
 def index():
     print("✅ Index page served.")
-    return send_file("/workspace/auth/index.html")
+    return serve_static(f"{AUTH_DIR}/index.html")
 
 # ─── Auth flow (delegated to gateway) ──────────────────────────────────────
 @app.route("/auth")
@@ -102,33 +373,45 @@ def auth():
 @app.route("/fail/")
 def fail():
     try:
-        return send_file("/workspace/auth/fail.html")
+        return serve_static(f"{AUTH_DIR}/fail.html")
     except Exception as e:
         print("⚠️ Fail page error:", e)
         return "<h1>Access Denied</h1><p>Fail page could not be loaded.</p>", 500
         
+@app.route("/unlock/status")
+def unlock_status():
+    """
+    Cheap entitlement check for the frontend; answered from memory. Anyone who
+    can reach the pod can call it, so it never includes the Patreon identity.
+    """
+    return unlock_state.to_dict()
+
 @app.route("/callback")
 @app.route("/callback/")
 def callback():
+    """Times every unlock attempt for /metrics."""
+    started = time.monotonic()
+    resp = app.make_response(handle_callback())
+    target = resp.headers.get("Location", "")
+    if target.endswith("/success"):
+        outcome = "unlocked"
+    elif target.endswith("/fail") or resp.status_code == 200:
+        outcome = "denied"
+    else:
+        outcome = "error"
+    record_callback(outcome, time.monotonic() - started)
+    return resp
+
+def handle_callback():
     """
     Gateway redirects here with ?token=<JWT>.
     We verify the JWT with our public key (RS256), then pull gated files
     through the gateway using that same JWT (one-time use).
     """
     # Reuse success within 24h if present
-    token_file = "/workspace/.flux_token"
-    if os.path.exists(token_file):
-        try:
-            ts = datetime.fromisoformat(open(token_file).read().strip())
-            if datetime.now(timezone.utc) - ts <= timedelta(hours=24):
-                print("✅ Already unlocked within last 24h")
-                return redirect("/success")
-        except Exception as e:
-            print(f"⚠️ Couldn't parse timestamp: {e}")
-            try:
-                os.remove(token_file)
-            except Exception:
-                pass
+    if unlock_state.is_unlocked():
+        print("✅ Already unlocked within last 24h")
+        return redirect("/success")
 
     token = request.args.get("token")
     if not token:
@@ -149,68 +432,336 @@ def callback():
 
     # Pull gated assets (workflow + helper scripts) via the gateway
     try:
-        # Main workflow
-        download_via_gateway(
-            token,
-            "workflow",
-            "/workspace/ComfyUI/user/default/workflows/Mega Flux v1.json",
-        )
-
-        # Helper scripts
+        # Main workflow + helper scripts, fetched concurrently over the shared session
+        assets = [("workflow", "/workspace/ComfyUI/user/default/workflows/Mega Flux v1.json")]
         scripts = [
             "download_all_mega_files.py",
             "download_small_mega_files.py",
             "download_all_mega_files_fp8.py",
         ]
         for name in scripts:
-            download_via_gateway(
-                token,
-                f"script?name={name}",
-                f"/workspace/scripts/{name}",
-            )
+            assets.append((f"script?name={name}", f"/workspace/scripts/{name}"))
+
+        etags = load_gateway_etags()
+        with ThreadPoolExecutor(max_workers=GATEWAY_FETCH_WORKERS) as pool:
+            futures = [pool.submit(download_via_gateway, token, rel, dest, etags) for rel, dest in assets]
+        save_gateway_etags(etags)
 
-        with open(token_file, "w") as f:
-            f.write(datetime.now(timezone.utc).isoformat())
+        # Entitlement failures win over transport errors so the user sees the right page
+        errors = [f.exception() for f in futures if f.exception()]
+        if errors:
+            raise next((e for e in errors if isinstance(e, EntitlementError)), errors[0])
+
+        unlock_state.mark_unlocked(claims)
 
         return redirect("/success")
 
     except EntitlementError as e:
         print(f"❌ Entitlement failure: {e}")
-        return send_file("/workspace/auth/fail.html")
+        return serve_static(f"{AUTH_DIR}/fail.html")
 
     except Exception as e:
         print(f"❌ Download via gateway failed: {e}")
         return "Failed to fetch gated files", 500
 
 # ─── Download status & triggers (unchanged behavior) ───────────────────────
-@app.route("/download/status/<version>")
-def download_status(version):
-    log_file_path = "/workspace/logs/power_user_downloads.log"
+DOWNLOAD_LOG = "/workspace/logs/power_user_downloads.log"
+
+class DownloadLogTracker:
+    """
+    Follows the download log incrementally. Each refresh reads only the bytes
+    appended since the last one and keeps the latest OVERALL/DETAIL/INFO lines
+    in memory, so a status poll costs the same no matter how big the log gets.
+    tqdm redraws its bar with carriage returns, so CR and LF both end a line.
+    """
+    PREFIXES = (("OVERALL::", "overall"), ("   DETAIL::", "detail"), ("INFO::", "info"))
+    # When attaching to an existing log, only its tail is scanned.
+    TAIL_BYTES = 256 * 1024
+    # Leading bytes remembered to notice a recreated log that reused the inode.
+    HEAD_BYTES = 64
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._reset(None)
+
+    def _reset(self, inode):
+        self._inode = inode
+        self._offset = 0
+        self._pending = ""
+        self._skip_first = False
+        self._head = b""
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        self._latest = {"overall": "Waiting for overall progress...", "detail": "", "info": ""}
+
+    def _consume(self, text):
+        lines = re.split(r"[\r\n]", self._pending + text)
+        self._pending = lines.pop()
+        if self._skip_first and lines:
+            # Attached mid-file: the first line is only a fragment.
+            lines, self._skip_first = lines[1:], False
+        for line in lines:
+            for prefix, key in self.PREFIXES:
+                if line.startswith(prefix):
+                    self._latest[key] = line.strip()
+                    break
+
+    def _attach(self, st):
+        self._reset(st.st_ino)
+        if st.st_size > self.TAIL_BYTES:
+            self._offset = st.st_size - self.TAIL_BYTES
+            self._skip_first = True
+
+    def snapshot(self):
+        """Latest status lines, or None if the log doesn't exist."""
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                self._reset(None)
+                return None
+            # Log was recreated or truncated by a new download: start over.
+            if st.st_ino != self._inode or st.st_size < self._offset:
+                self._attach(st)
+            if st.st_size > self._offset:
+                with open(self.path, "rb") as f:
+                    head = f.read(self.HEAD_BYTES)
+                    if head[:len(self._head)] != self._head:
+                        self._attach(st)
+                    self._head = head
+                    f.seek(self._offset)
+                    data = f.read(st.st_size - self._offset)
+                self._offset += len(data)
+                self._consume(self._decoder.decode(data))
+            return dict(self._latest)
+
+log_tracker = DownloadLogTracker(DOWNLOAD_LOG)
+
+def progress_file(version):
+    """Where a download started for `version` publishes its JSON progress (MXD_PROGRESS_FILE)."""
+    return f"/workspace/logs/download_{version}.progress.json"
+
+class ProgressFileReader:
+    """Reads downloader progress files, re-parsing one only when its mtime/size changes."""
+    def __init__(self):
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def read(self, path):
+        """Parsed progress, or None if the file doesn't exist (yet)."""
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        sig = (st.st_mtime_ns, st.st_size)
+        with self._lock:
+            cached = self._cache.get(path)
+            if cached and cached[0] == sig:
+                return cached[1]
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return cached[1] if cached else None  # mid-replace on an odd filesystem
+        with self._lock:
+            self._cache[path] = (sig, data)
+        return data
+
+progress_reader = ProgressFileReader()
+
+def _fmt_bytes(n):
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:.1f} {unit}"
+        n /= 1024
+
+def progress_lines(data):
+    """The overall/detail/info lines the downloading page shows, built from a progress file."""
+    overall = data.get("overall") or {}
+    files = data.get("files") or {}
+    done = overall.get("files_done", sum(f["state"] in ("done", "skipped", "failed") for f in files.values()))
+    total = overall.get("files_total", len(files))
+    line = f"OVERALL:: {done}/{total} files"
+    if overall.get("rate"):
+        line += f" · {_fmt_bytes(overall['rate'])}/s"
+
+    active = []
+    for name, f in files.items():
+        if f["state"] != "downloading":
+            continue
+        part = name
+        if f.get("total"):
+            part += f" {100 * f['bytes_done'] // f['total']}% of {_fmt_bytes(f['total'])}"
+        if f.get("rate"):
+            part += f" @ {_fmt_bytes(f['rate'])}/s"
+        active.append(part)
+
+    info = ""
+    last = data.get("last_finished")
+    if last:
+        info = {
+            "done": f"INFO:: ✅ Verified: {last['name']}",
+            "skipped": f"INFO:: ✅ Skipping {last['name']} (already present)",
+            "failed": f"INFO:: ❌ Failed: {last['name']}",
+            "cancelled": f"INFO:: 🟥 Cancelled: {last['name']}",
+        }.get(last["state"], "")
+    return {"overall": line, "detail": ("   DETAIL:: " + " | ".join(active)) if active else "", "info": info}
+
+def _download_state(version):
     done_file = f"/workspace/logs/download_{version}.done"
 
     if os.path.exists(done_file):
         return {"status": "complete"}
 
-    if not os.path.exists(log_file_path):
-        return {"status": "starting"}
+    job = download_jobs.get(version)
+    if job is not None and job.state == "failed":
+        return {"status": "failed", "exit_code": job.exit_code}
 
     try:
-        with open(log_file_path, "r", encoding="utf-8") as f:
-            lines = f.readlines()
+        # Downloaders built on install_maxedout publish structured progress; older
+        # scripts only have the log, which is still followed as before.
+        data = progress_reader.read(progress_file(version))
+        if data is not None:
+            return {"status": "downloading", **progress_lines(data)}
+        latest = log_tracker.snapshot()
+        if latest is None:
+            return {"status": "starting"}
+        return {"status": "downloading", **latest}
+    except Exception as e:
+        print(f"Error reading log status: {e}")
+        return {"status": "error"}
 
-        overall_line = next((line for line in reversed(lines) if line.startswith("OVERALL::")), "Waiting for overall progress...")
-        detail_line = next((line for line in reversed(lines) if line.startswith("   DETAIL::")), "")
-        info_line = next((line for line in reversed(lines) if line.startswith("INFO::")), "")
+@app.route("/download/status/<version>")
+def download_status(version):
+    return _download_state(version)
+
+# Written by the staged core download that start.sh runs in the background.
+READY_FILE = os.environ.get("MXD_READY_FILE", "/workspace/logs/mxd_ready.json")
+CORE_INSTALL_LOCK = "/workspace/.flux_installed"
+
+@app.route("/ready")
+def model_readiness():
+    """Which model tiers (text encoders/VAE, UNET, extras) are on disk yet."""
+    data = progress_reader.read(READY_FILE)
+    if data is None:
+        # No staged download has run here; an install from an older image may still be complete.
+        return {"ready": os.path.exists(CORE_INSTALL_LOCK), "tiers": {}}
+    return data
+
+# Server-Sent Events: how often the log is checked, and the keep-alive interval.
+SSE_TICK = 0.25
+SSE_HEARTBEAT = 15
+# Each open event stream pins a server thread; cap them so pollers can't starve /callback.
+# Over the cap we answer 503 and the page falls back to plain polling.
+AUTH_THREADS = int(os.environ.get("AUTH_THREADS", "16"))
+SSE_MAX_STREAMS = max(1, AUTH_THREADS // 2)
+_sse_slots = threading.BoundedSemaphore(SSE_MAX_STREAMS)
+
+@app.route("/download/events/<version>")
+def download_events(version):
+    """Pushes each status change to the browser as it appears in the log."""
+    if version not in ["all", "small", "all_fp8"]:
+        return "Invalid version specified", 404
 
+    if not _sse_slots.acquire(blocking=False):
+        return "Too many event streams, use /download/status instead", 503
+
+    def stream():
+        last, last_sent = None, time.monotonic()
+        yield "retry: 2000\n\n"
+        while True:
+            state = _download_state(version)
+            if state != last:
+                last, last_sent = state, time.monotonic()
+                yield f"data: {json.dumps(state)}\n\n"
+                if state["status"] in ("complete", "failed"):
+                    return
+            elif time.monotonic() - last_sent >= SSE_HEARTBEAT:
+                last_sent = time.monotonic()
+                yield ": keep-alive\n\n"
+            time.sleep(SSE_TICK)
+
+    response = Response(
+        stream_with_context(stream()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # The server closes the response even when the body is never iterated (HEAD,
+    # a client gone before the first chunk), so the slot is released there.
+    response.call_on_close(_sse_slots.release)
+    return response
+
+class DownloadJob:
+    """One download subprocess started by /download/<version>."""
+    def __init__(self, version, script_name, proc):
+        self.version = version
+        self.script_name = script_name
+        self.proc = proc
+        self.pid = proc.pid
+        self.started_at = datetime.now(timezone.utc)
+        self.exit_code = None
+
+    @property
+    def state(self):
+        if self.exit_code is None:
+            self.exit_code = self.proc.poll()
+        if self.exit_code is None:
+            return "running"
+        return "finished" if self.exit_code == 0 else "failed"
+
+    def to_dict(self):
         return {
-            "status": "downloading",
-            "overall": overall_line.strip(),
-            "detail": detail_line.strip(),
-            "info": info_line.strip(),
+            "version": self.version,
+            "script": self.script_name,
+            "pid": self.pid,
+            "state": self.state,
+            "started_at": self.started_at.isoformat(),
+            "exit_code": self.exit_code,
         }
-    except Exception as e:
-        print(f"Error reading log status: {e}")
-        return {"status": "error"}
+
+class JobLimitReached(RuntimeError):
+    pass
+
+class DownloadJobRegistry:
+    """
+    Keeps at most one job per version and at most `max_active` running jobs in
+    total. All power-user scripts share one log file, so the default cap is 1.
+    """
+    def __init__(self, max_active):
+        self.max_active = max_active
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def get(self, version):
+        with self._lock:
+            return self._jobs.get(version)
+
+    def start(self, version, launch):
+        """
+        Returns (job, created). A running job for `version` is returned as-is;
+        otherwise `launch()` must start and return the new Popen. Raises
+        JobLimitReached when too many other downloads are running.
+        """
+        with self._lock:
+            job = self._jobs.get(version)
+            if job is not None and job.state == "running":
+                return job, False
+            active = [j for j in self._jobs.values() if j.state == "running"]
+            if len(active) >= self.max_active:
+                raise JobLimitReached(", ".join(j.version for j in active))
+            job = DownloadJob(version, *launch())
+            self._jobs[version] = job
+            return job, True
+
+    def snapshot(self):
+        with self._lock:
+            return {version: job.to_dict() for version, job in self._jobs.items()}
+
+download_jobs = DownloadJobRegistry(int(os.environ.get("MAX_ACTIVE_DOWNLOADS", "1")))
+
+@app.route("/download/jobs")
+def download_jobs_status():
+    return download_jobs.snapshot()
 
 @app.route("/download/<version>")
 def download_mega(version):
@@ -228,42 +779,90 @@ def download_mega(version):
     if not os.path.exists(script_path):
         return f"Script {script_name} not found.", 500
 
-    log_file_path = "/workspace/logs/power_user_downloads.log"
+    log_file_path = DOWNLOAD_LOG
     done_file = f"/workspace/logs/download_{version}.done"
-    os.makedirs(os.path.dirname(log_file_path), exist_ok=True)
+    progress_path = progress_file(version)
 
-    # Clean old files
-    if os.path.exists(done_file):
-        os.remove(done_file)
-    if os.path.exists(log_file_path):
-        os.remove(log_file_path)
+    def launch():
+        os.makedirs(os.path.dirname(log_file_path), exist_ok=True)
+
+        # Clean old files (only when actually starting a new job)
+        if os.path.exists(done_file):
+            os.remove(done_file)
+        if os.path.exists(log_file_path):
+            os.remove(log_file_path)
+        if os.path.exists(progress_path):
+            os.remove(progress_path)
 
-    try:
         with open(log_file_path, "a") as log_file:
             print(f"🚀 Starting download for '{version}'. Log: {log_file_path}")
-            subprocess.Popen(
+            proc = subprocess.Popen(
                 ["python3", "-u", script_path],
                 stdout=log_file,
                 stderr=subprocess.STDOUT,
                 cwd="/workspace/scripts",
+                env={**os.environ, "MXD_PROGRESS_FILE": progress_path},
             )
+        return script_name, proc
+
+    try:
+        job, created = download_jobs.start(version, launch)
+    except JobLimitReached as e:
+        print(f"⏳ Refusing '{version}' download: already running: {e}")
+        return f"Another download is already running ({e}). Please wait for it to finish.", 429
     except Exception as e:
         print(f"🔥 CRITICAL ERROR starting subprocess for {script_name}: {e}")
         return "An unexpected error occurred while trying to start the download.", 500
 
+    if not created:
+        print(f"↪️  '{version}' download already running (pid {job.pid}). Attaching.")
     return redirect(f"/downloading/{version}")
 
 @app.route("/downloading/<version>")
 def downloading_page(version):
     if version not in ["all", "small", "all_fp8"]:
         return "Invalid version specified", 404
-    return send_file("/workspace/auth/downloading.html")
+    return serve_static(f"{AUTH_DIR}/downloading.html")
+
+@app.route("/metrics")
+def metrics():
+    with _callback_results_lock:
+        results = {_series_labels("outcome", k): v for k, v in callback_results.items()}
+    own = {
+        "counters": {"auth_callbacks_total": results},
+        "histograms": {"auth_callback_seconds": {"": callback_seconds.to_dict()}},
+    }
+    lines = render_metrics(own)
+    try:
+        with open(DOWNLOAD_METRICS) as f:
+            downloads = json.load(f)
+        lines += render_metrics(downloads)
+        lines.append("# TYPE mxd_metrics_updated_timestamp_seconds gauge")
+        lines.append(f"mxd_metrics_updated_timestamp_seconds {downloads.get('updated', 0)}")
+    except (OSError, ValueError):
+        pass  # no download has run on this pod yet
+    return Response("\n".join(lines) + "\n", content_type="text/plain; version=0.0.4; charset=utf-8")
 
 # Serve images
 @app.route("/images/<path:filename>")
 def serve_image(filename):
-    return send_from_directory("/workspace/auth/images", filename)
+    path = safe_join(f"{AUTH_DIR}/images", filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    return serve_static(path, cache_control="public, max-age=86400")
 
 # ─── Main ───────────────────────────────────────────────────────────────────
+# AUTH_SERVER=waitress (default) runs a threaded production server; slow clients are
+# buffered by its I/O loop so they don't hold a worker. AUTH_SERVER=dev keeps Flask's server.
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=7860)
+    server = os.environ.get("AUTH_SERVER", "waitress")
+    if server == "waitress":
+        try:
+            from waitress import serve
+        except ImportError:
+            print("⚠️ waitress not installed, falling back to Flask's threaded server")
+        else:
+            print(f"🔐 Serving with waitress ({AUTH_THREADS} threads)")
+            serve(app, host="0.0.0.0", port=7860, threads=AUTH_THREADS)
+            sys.exit(0)
+    app.run(host="0.0.0.0", port=7860, threaded=True)
@@ -3,7 +3,10 @@ from .nodes import (
     NODE_DISPLAY_NAME_MAPPINGS,
 )
 
+WEB_DIRECTORY = "./web/js"
+
 __all__ = [
     "NODE_CLASS_MAPPINGS",
     "NODE_DISPLAY_NAME_MAPPINGS",
+    "WEB_DIRECTORY",
 ]
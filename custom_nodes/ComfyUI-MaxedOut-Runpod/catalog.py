@@ -0,0 +1,136 @@
+from __future__ import annotations
+import threading
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+from .install_maxedout_nodes import get_model_files, resume_offset, MODEL_DIR
+
+# ── UNET Catalog ────────────────────────────────────────────────────────────
+FP8_HEADER = "— FP8 —"
+FP16_HEADER = "— FP16 —"
+
+
+@dataclass(frozen=True)
+class UnetEntry:
+    name: str
+    hf_path: str
+    local_rel_path: str
+    sha256: str
+
+    @property
+    def local_path(self) -> Path:
+        return MODEL_DIR / self.local_rel_path
+
+    @property
+    def part_path(self) -> Path:
+        # Same naming as the node downloader's .part file.
+        return self.local_path.with_suffix(".part")
+
+
+@dataclass(frozen=True)
+class UnetCatalog:
+    keys: tuple[str, ...]                 # dropdown order, section headers included
+    choices: dict[str, UnetEntry | None]  # headers map to None
+
+
+@lru_cache(maxsize=1)
+def unet_catalog() -> UnetCatalog:
+    """The curated UNET list grouped into FP8 / FP16 sections. Built once per process."""
+    fp8, fp16 = [], []
+    for path, local, sha in get_model_files(schnell=True):
+        if not local.startswith("diffusion_models/"):
+            continue
+        name = local.split("/")[-1]
+        if "-fp8" in name:
+            fp8.append(UnetEntry(name, path, local, sha))
+        elif "-fp16" in name:
+            fp16.append(UnetEntry(name, path, local, sha))
+
+    keys, choices = [], {}
+    for header, entries in ((FP8_HEADER, fp8), (FP16_HEADER, fp16)):
+        if not entries:
+            continue
+        keys.append(header)
+        choices[header] = None
+        for entry in sorted(entries, key=lambda e: e.name):
+            keys.append(entry.name)
+            choices[entry.name] = entry
+    return UnetCatalog(tuple(keys), choices)
+
+
+# ── Availability Index ──────────────────────────────────────────────────────
+class AvailabilityIndex:
+    """
+    Marks each catalog entry as local, partial (a .part is on disk) or missing.
+    Adding, removing or renaming a file changes its directory's mtime, so a
+    directory is only re-listed when that mtime moves; between changes a
+    refresh costs one stat per directory plus one per in-progress .part.
+    """
+    def __init__(self, entries: list[UnetEntry]):
+        self._by_dir: dict[Path, list[UnetEntry]] = {}
+        for entry in entries:
+            self._by_dir.setdefault(entry.local_path.parent, []).append(entry)
+        self._dir_mtimes: dict[Path, int | None] = {}
+        self._status: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _size(path: Path) -> int | None:
+        try:
+            return path.stat().st_size
+        except OSError:
+            return None
+
+    @staticmethod
+    def _partial_bytes(part: Path) -> int | None:
+        # Installer .part files are preallocated; their sidecar says how much is real.
+        try:
+            return resume_offset(part)[0]
+        except OSError:
+            return None
+
+    def _scan(self, entries: list[UnetEntry]) -> None:
+        for entry in entries:
+            size = self._size(entry.local_path)
+            if size is not None:
+                self._status[entry.name] = {"state": "local", "bytes": size}
+                continue
+            part = self._partial_bytes(entry.part_path)
+            if part is not None:
+                self._status[entry.name] = {"state": "partial", "bytes": part}
+            else:
+                self._status[entry.name] = {"state": "missing", "bytes": 0}
+
+    def refresh(self) -> dict[str, dict]:
+        """Current {name: {"state", "bytes"}} for every entry."""
+        with self._lock:
+            for directory, entries in self._by_dir.items():
+                try:
+                    mtime = directory.stat().st_mtime_ns
+                except OSError:
+                    mtime = None
+                if mtime != self._dir_mtimes.get(directory, -1):
+                    self._dir_mtimes[directory] = mtime
+                    self._scan(entries)
+                else:
+                    # A growing .part doesn't touch the directory; re-stat just those.
+                    self._scan([e for e in entries if self._status[e.name]["state"] == "partial"])
+            return {name: dict(status) for name, status in self._status.items()}
+
+
+@lru_cache(maxsize=1)
+def unet_availability() -> AvailabilityIndex:
+    entries = [entry for entry in unet_catalog().choices.values() if entry is not None]
+    return AvailabilityIndex(entries)
+
+
+def default_unet() -> str:
+    """First model already on disk, else the first model in the list."""
+    catalog = unet_catalog()
+    status = unet_availability().refresh()
+    names = [key for key in catalog.keys if catalog.choices[key] is not None]
+    for name in names:
+        if status[name]["state"] == "local":
+            return name
+    return names[0] if names else ""
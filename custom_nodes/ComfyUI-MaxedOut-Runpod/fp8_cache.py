@@ -0,0 +1,82 @@
+from __future__ import annotations
+import os
+from pathlib import Path
+
+import torch
+from safetensors.torch import load_file, save_file
+
+# ── FP8 Conversion Cache ────────────────────────────────────────────────────
+# Picking an fp16 UNET with an fp8 weight_dtype reads the full fp16 file and
+# casts every weight on each load. With MXD_FP8_CACHE=1 the first load writes
+# the already-cast weights next to the model, and later loads read that
+# half-size file instead. Files are named after the source's SHA256, so a new
+# model version never picks up a stale conversion.
+FP8_CACHE = os.environ.get("MXD_FP8_CACHE", "0") == "1"
+CACHE_SUFFIX = ".fp8cache"  # not a model extension, so ComfyUI's own loaders don't list these
+
+# weight_dtype option -> (cache tag, torch dtype). The _fast variant stores the same weights.
+FP8_DTYPES = {
+    "fp8_e4m3fn": ("fp8_e4m3fn", torch.float8_e4m3fn),
+    "fp8_e4m3fn_fast": ("fp8_e4m3fn", torch.float8_e4m3fn),
+    "fp8_e5m2": ("fp8_e5m2", torch.float8_e5m2),
+}
+
+
+def cache_path(src: Path, sha256: str, weight_dtype: str) -> Path:
+    tag, _ = FP8_DTYPES[weight_dtype]
+    return src.with_name(f"{src.name}.{tag}.{sha256[:16]}{CACHE_SUFFIX}")
+
+
+def convert_state_dict(sd: dict, dtype: torch.dtype) -> dict:
+    """
+    Casts the weight matrices (floating tensors with 2+ dims) to `dtype`; biases,
+    norms and other 1-D tensors keep their dtype and are cast at load time as
+    before. This is the same cast ComfyUI applies when it copies fp16 weights
+    into fp8 layers, so the loaded weights are unchanged.
+    """
+    out = {}
+    for key, tensor in sd.items():
+        if tensor.is_floating_point() and tensor.ndim >= 2 and tensor.element_size() > 1:
+            out[key] = tensor.to(dtype)
+        else:
+            out[key] = tensor
+    return out
+
+
+def load_state_dict(src: Path, sha256: str, weight_dtype: str) -> tuple[dict, bool]:
+    """
+    The state dict for `src` with its weights already in `weight_dtype`, read
+    from the conversion cache when present, otherwise converted and written to
+    it. Returns (state_dict, cache_hit).
+    """
+    cached = cache_path(src, sha256, weight_dtype)
+    if cached.is_file():
+        try:
+            return load_file(str(cached)), True
+        except Exception as e:
+            print(f"⚠️ Ignoring unreadable fp8 cache {cached.name}: {e}")
+            cached.unlink(missing_ok=True)
+
+    _, dtype = FP8_DTYPES[weight_dtype]
+    sd = convert_state_dict(load_file(str(src)), dtype)
+    tmp = cached.with_name(f"{cached.name}.{os.getpid()}.tmp")
+    try:
+        save_file(sd, str(tmp), metadata={"source_sha256": sha256, "weight_dtype": weight_dtype})
+        os.replace(tmp, cached)
+        print(f"💾 Saved fp8 copy of {src.name} as {cached.name}")
+    except OSError as e:
+        tmp.unlink(missing_ok=True)
+        print(f"⚠️ Could not write fp8 cache for {src.name}: {e}")
+    return sd, False
+
+
+def wants_conversion(src: Path, weight_dtype: str, info=None) -> bool:
+    """
+    Only safetensors sources that aren't already fp8 are worth converting.
+    `info` (from safetensors_index) gives the real dtype; without it the file name decides.
+    """
+    if not (FP8_CACHE and weight_dtype in FP8_DTYPES and src.suffix == ".safetensors"):
+        return False
+    if info is not None:
+        return not info.is_fp8
+    return "-fp8" not in src.name
@@ -1,8 +1,15 @@
 #!/usr/bin/env python
 
 from __future__ import annotations
-import sys, subprocess, time, atexit, signal, requests, hashlib
+import os, sys, json, errno, shutil, threading, subprocess, time, atexit, signal, requests, hashlib
+from contextlib import contextmanager
 from pathlib import Path
+from typing import Callable
+
+try:
+    import fcntl
+except ImportError:  # non-POSIX: fall back to in-process locking only
+    fcntl = None
 
 # --- Configuration for RunPod ---
 # Set to True to also download the faster, lower-quality Schnell model.
@@ -18,6 +25,8 @@ BASE_URL = (
 MODEL_DIR = Path("/workspace/ComfyUI/models")
 LOG_DIR = Path("install_logs_mxd")
 TEST_MODE = "--test" in sys.argv
+# Re-hash every existing file instead of trusting the verified-hash manifest.
+DEEP_VERIFY = "--deep-verify" in sys.argv
 
 # --- Stream redirection for logging ---
 _orig_stdout = sys.stdout
@@ -70,6 +79,26 @@ def _get_local_sha256(file_path: Path) -> str | None:
         log(f"⚠️  Could not read file for hashing: {file_path.name} - {e}")
         return None
 
+def _safetensors_truncated(file_path: Path) -> bool:
+    """
+    True when a .safetensors file is shorter than its own header says (an
+    interrupted copy). Reads only the header, so it's instant even on 20 GB files.
+    """
+    if file_path.suffix != ".safetensors":
+        return False
+    try:
+        with open(file_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            header_len = int.from_bytes(f.read(8), "little")
+            if size < 8 or 8 + header_len > size:
+                return True
+            header = json.loads(f.read(header_len))
+        header.pop("__metadata__", None)
+        data_end = max((t["data_offsets"][1] for t in header.values()), default=0)
+    except (OSError, ValueError, KeyError, TypeError, IndexError, AttributeError):
+        return False  # not something we can judge; leave it to the hash check
+    return size < 8 + header_len + data_end
+
 def _remote_size(url: str) -> int | None:
     """Gets the size of a remote file."""
     for attempt in range(RETRIES):
@@ -84,6 +113,181 @@ def _remote_size(url: str) -> int | None:
     log("🚫 Failed to get remote file size after multiple attempts.")
     return None
 
+# ── Verified-Hash Manifest ─────────────────────────────────────────────────
+# Same on-disk format as scripts/install_maxedout.py, so both share one manifest.
+_manifest_lock = threading.Lock()
+
+def _manifest_path() -> Path:
+    return MODEL_DIR / ".mxd_manifest.json"
+
+def _manifest_key(file_path: Path) -> str:
+    try:
+        return file_path.relative_to(MODEL_DIR).as_posix()
+    except ValueError:
+        return str(file_path)
+
+def _load_manifest() -> dict:
+    try:
+        return json.loads(_manifest_path().read_text())
+    except (OSError, ValueError):
+        return {}
+
+def _stat_entry(file_path: Path) -> dict:
+    st = file_path.stat()
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "inode": st.st_ino}
+
+def _manifest_lookup(file_path: Path) -> str | None:
+    """Returns the recorded sha256 if the file's stat tuple still matches the manifest."""
+    entry = _load_manifest().get(_manifest_key(file_path))
+    if not entry:
+        return None
+    try:
+        current = _stat_entry(file_path)
+    except OSError:
+        return None
+    if any(entry.get(k) != v for k, v in current.items()):
+        return None
+    return entry.get("sha256")
+
+def _manifest_update(file_path: Path, sha256: str | None) -> None:
+    """Records (or with sha256=None, forgets) a verified file. Safe across threads and processes."""
+    with _manifest_lock:
+        path = _manifest_path()
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # The core download, ComfyUI's node downloader and power-user jobs share
+            # this manifest; the flock keeps them from dropping each other's entries.
+            with open(path.with_name(path.name + ".lock"), "a") as lock_fp:
+                if fcntl is not None:
+                    fcntl.flock(lock_fp, fcntl.LOCK_EX)
+                manifest = _load_manifest()
+                key = _manifest_key(file_path)
+                if sha256 is None:
+                    if manifest.pop(key, None) is None:
+                        return
+                else:
+                    manifest[key] = {**_stat_entry(file_path), "sha256": sha256.lower()}
+                tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+                tmp.write_text(json.dumps(manifest, indent=1, sort_keys=True))
+                os.replace(tmp, path)
+        except OSError as e:
+            log(f"⚠️  Could not update hash manifest: {e}")
+
+# ── Content-Addressed Blob Store ───────────────────────────────────────────
+# Every verified file lives once under <blob dir>/sha256/<ab>/<sha256>; the
+# ComfyUI model paths are hardlinks (or symlinks across filesystems) to it.
+# MXD_BLOB_DIR can point at a shared cache volume to repopulate a pod by linking.
+_blob_thread_locks: dict[str, threading.Lock] = {}
+_blob_thread_locks_guard = threading.Lock()
+
+def _blob_dir() -> Path:
+    return Path(os.environ.get("MXD_BLOB_DIR") or MODEL_DIR / ".blobs")
+
+def _blob_path(sha256: str) -> Path:
+    sha256 = sha256.lower()
+    return _blob_dir() / "sha256" / sha256[:2] / sha256
+
+@contextmanager
+def _blob_lock(sha256: str):
+    """Serialises work on one hash across threads and processes (installer + custom node)."""
+    sha256 = sha256.lower()
+    with _blob_thread_locks_guard:
+        thread_lock = _blob_thread_locks.setdefault(sha256, threading.Lock())
+    with thread_lock:
+        if fcntl is None:
+            yield
+            return
+        lock_path = _blob_path(sha256).with_suffix(".lock")
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(lock_path, "a") as fp:
+            fcntl.flock(fp.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fp.fileno(), fcntl.LOCK_UN)
+
+def _blob_ready(sha256: str) -> bool:
+    """True if the blob for `sha256` exists and is verified (via manifest or a full hash)."""
+    blob = _blob_path(sha256)
+    if not blob.is_file():
+        return False
+    if not DEEP_VERIFY and _manifest_lookup(blob) == sha256.lower():
+        return True
+    actual = _get_local_sha256(blob)
+    if actual and actual.lower() == sha256.lower():
+        _manifest_update(blob, actual)
+        return True
+    log(f"⚠️ Blob {blob.name[:12]}… is corrupt. Removing it.")
+    _manifest_update(blob, None)
+    blob.unlink(missing_ok=True)
+    return False
+
+def _link_from_blob(sha256: str, local_path: Path) -> None:
+    """Materialises `local_path` as a hardlink to the blob, or a symlink across filesystems."""
+    blob = _blob_path(sha256)
+    tmp = local_path.with_name(local_path.name + ".link")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(blob, tmp)
+    except OSError:
+        os.symlink(blob, tmp)
+    os.replace(tmp, local_path)
+
+def _copy_into_blob(src: Path, sha256: str) -> None:
+    """Copies a verified file into a blob store on another filesystem (temp file, then rename)."""
+    blob = _blob_path(sha256)
+    tmp = blob.with_name(f"{blob.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, blob)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    _manifest_update(blob, sha256)
+
+def _adopt_into_blob(local_path: Path, sha256: str) -> None:
+    """
+    Registers an already-verified model file in the blob store: a hardlink, or
+    when an explicit MXD_BLOB_DIR is on another filesystem, a copy there that
+    the model path is then linked to. The default in-tree store never copies.
+    """
+    blob = _blob_path(sha256)
+    if blob.exists() or local_path.is_symlink():
+        return
+    try:
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        os.link(local_path, blob)
+        _manifest_update(blob, sha256)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV or not os.environ.get("MXD_BLOB_DIR"):
+            return  # keep the plain file
+    try:
+        _copy_into_blob(local_path, sha256)
+        _link_from_blob(sha256, local_path)
+    except OSError as e:
+        log(f"⚠️  Could not copy {local_path.name} into the blob store: {e}")
+
+def _store_verified(tmp_path: Path, local_path: Path, sha256: str) -> None:
+    """Moves a verified .part into the blob store and links the model path to it."""
+    blob = _blob_path(sha256)
+    try:
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, blob)
+    except OSError as e:
+        try:
+            if e.errno != errno.EXDEV:
+                raise
+            # Blob store on another filesystem (a shared cache volume): copy it there.
+            _copy_into_blob(tmp_path, sha256)
+        except OSError as err:
+            log(f"⚠️  Could not store {local_path.name} in the blob store: {err}")
+            tmp_path.rename(local_path)  # keep the file at its model path
+            return
+        tmp_path.unlink()
+    _manifest_update(blob, sha256)
+    _link_from_blob(sha256, local_path)
+
 # ── Dependency Installation ────────────────────────────────────────────────
 def install_pip_package(package_name: str, install_args: list[str] = None):
     """Installs a Python package using pip if it's not already installed."""
@@ -143,21 +347,65 @@ def clone_custom_nodes():
         FAILED_FILES.append(("custom_nodes/ComfyUI-MaxedOut", "Initial Git clone failed"))
 
 # ── File Downloading Logic ──────────────────────────────────────────────────
-def _download_once(url: str, tmp_path: Path, resume: bool = False) -> int:
-    """Performs a single download attempt, with resume logic."""
-    range_header, mode, start_byte = {}, "wb", 0
+def _sidecar_path(tmp_path: Path) -> Path:
+    """The installer's resume record for a .part file (see scripts/install_maxedout.py)."""
+    return tmp_path.with_name(tmp_path.name + ".json")
+
+def _clear_partial(tmp_path: Path) -> None:
+    """Removes a .part file and its sidecar, if present."""
+    for p in (tmp_path, _sidecar_path(tmp_path)):
+        p.unlink(missing_ok=True)
+
+def resume_offset(tmp_path: Path) -> tuple[int, str | None]:
+    """
+    (valid bytes at the start of a .part, ETag they came from). The installer
+    preallocates its .part files to full size, so when its sidecar exists that,
+    not the file size, says how much is real.
+    """
+    size = tmp_path.stat().st_size
+    try:
+        state = json.loads(_sidecar_path(tmp_path).read_text())
+    except FileNotFoundError:
+        return size, None  # our own .part: everything written is valid
+    except (OSError, ValueError):
+        return 0, None
+    if state.get("mode") == "stream":
+        return min(int(state.get("length", 0)), size), state.get("etag")
+    if state.get("mode") == "segments":
+        # Only the unbroken run of finished segments from the start can be resumed.
+        done, count = set(state.get("done", [])), 0
+        while count in done:
+            count += 1
+        return min(count * state.get("segment_size", 0), state.get("size", 0), size), state.get("etag")
+    return 0, None
+
+def _download_once(url: str, tmp_path: Path, resume: bool = False,
+                   progress: Callable[[int, int | None], None] | None = None) -> int:
+    """
+    Performs a single download attempt, with resume logic.
+    `progress(bytes_done, total)` is called at most every PROG_INT seconds.
+    """
+    range_header, start_byte = {}, 0
     if resume and tmp_path.exists():
-        start_byte = tmp_path.stat().st_size
+        start_byte, etag = resume_offset(tmp_path)
         if start_byte > 0:
             range_header = {"Range": f"bytes={start_byte}-"}
-            mode = "ab"
+            if etag:
+                range_header["If-Range"] = etag
 
     with requests.get(url, stream=True, timeout=(10, 300), headers=range_header) as r:
         r.raise_for_status()
+        if start_byte and r.status_code != 206:
+            start_byte = 0  # Range ignored or the file changed: start over
+        if not start_byte:
+            _sidecar_path(tmp_path).unlink(missing_ok=True)
         total_expected = int(r.headers.get("Content-Length", 0)) + start_byte
         written, last_print = start_byte, 0
 
-        with open(tmp_path, mode) as f:
+        # Write from the resume point and drop whatever lies past it (a preallocated tail).
+        with open(tmp_path, "r+b" if start_byte else "wb") as f:
+            f.seek(start_byte)
+            f.truncate()
             for chunk in r.iter_content(chunk_size=CHUNK):
                 f.write(chunk)
                 written += len(chunk)
@@ -170,6 +418,8 @@ def _download_once(url: str, tmp_path: Path, resume: bool = False) -> int:
                     _orig_stdout.write(f"\r   📥 {tmp_path.name}{pct}  ")
                     _orig_stdout.flush()
                     last_print = now
+                    if progress is not None:
+                        progress(written, total_expected or None)
     
     _orig_stdout.write("\n")
     _orig_stdout.flush()
@@ -179,18 +429,39 @@ def _download_once(url: str, tmp_path: Path, resume: bool = False) -> int:
     
     return written
 
-def download(remote_path: str, local_path: Path, expected_sha256: str) -> None:
+def download(remote_path: str, local_path: Path, expected_sha256: str,
+             progress: Callable[[int, int | None], None] | None = None) -> None:
     """Main download wrapper with retries, resume, and hash checking."""
+    local_path.parent.mkdir(parents=True, exist_ok=True)
+    with _blob_lock(expected_sha256):
+        _download_locked(remote_path, local_path, expected_sha256, progress)
+
+def _download_locked(remote_path: str, local_path: Path, expected_sha256: str,
+                     progress: Callable[[int, int | None], None] | None = None) -> None:
     if local_path.exists():
+        if not DEEP_VERIFY and _manifest_lookup(local_path) == expected_sha256.lower():
+            _adopt_into_blob(local_path, expected_sha256)
+            log(f"✅ File already exists and is unchanged since verification: {local_path.name}")
+            return
         log(f"✅ File already exists: {local_path.name}. Verifying hash...")
-        local_hash = _get_local_sha256(local_path)
+        # A cut-short file fails the hash anyway; the header says so without reading 20 GB.
+        local_hash = None if _safetensors_truncated(local_path) else _get_local_sha256(local_path)
         if local_hash and local_hash.lower() == expected_sha256.lower():
+            _manifest_update(local_path, local_hash)
+            _adopt_into_blob(local_path, expected_sha256)
             log("   ✅ Hash matches. Skipping download.")
             return
         else:
             log("   ⚠️ Hash mismatch or unreadable. Re-downloading.")
+            _manifest_update(local_path, None)
             local_path.unlink()
 
+    if _blob_ready(expected_sha256):
+        _link_from_blob(expected_sha256, local_path)
+        _manifest_update(local_path, expected_sha256)
+        log(f"✅ Linked {local_path.name} from the blob store. Skipping download.")
+        return
+
     url = f"{BASE_URL}/{remote_path}"
     tmp_path = local_path.with_suffix(".part")
     local_path.parent.mkdir(parents=True, exist_ok=True)
@@ -199,11 +470,13 @@ def download(remote_path: str, local_path: Path, expected_sha256: str) -> None:
         try:
             log(f"⬇️  Downloading {local_path.name} (Attempt {attempt}/{RETRIES})")
             resume_flag = tmp_path.exists()
-            _download_once(url, tmp_path, resume=resume_flag)
+            _download_once(url, tmp_path, resume=resume_flag, progress=progress)
             
             final_hash = _get_local_sha256(tmp_path)
             if final_hash and final_hash.lower() == expected_sha256.lower():
-                tmp_path.rename(local_path)
+                _store_verified(tmp_path, local_path, final_hash)
+                _clear_partial(tmp_path)
+                _manifest_update(local_path, final_hash)
                 log(f"   ✅ Download complete and verified: {local_path.name}")
                 return
             else:
@@ -213,7 +486,7 @@ def download(remote_path: str, local_path: Path, expected_sha256: str) -> None:
             log(f"   ⚠️ Download failed: {e}")
             if tmp_path.exists():
                 try:
-                    tmp_path.unlink()
+                    _clear_partial(tmp_path)
                 except OSError as unlink_err:
                     log(f"   ⚠️ Could not delete .part file: {unlink_err}")
             if attempt < RETRIES:
@@ -0,0 +1,103 @@
+from __future__ import annotations
+import os, threading
+from collections import OrderedDict
+from pathlib import Path
+
+# ── Loaded-Model Cache ──────────────────────────────────────────────────────
+# Keeps recently loaded UNETs in host RAM so swapping back to one (Dev → Fill →
+# Dev) skips re-reading 12–23 GB from the volume. Entries are evicted least
+# recently used first once their combined size passes the budget.
+#   MXD_UNET_CACHE_GB unset -> 40% of system RAM
+#   MXD_UNET_CACHE_GB=0     -> disabled
+DEFAULT_BUDGET_FRACTION = 0.4
+
+
+def _default_budget() -> int:
+    setting = os.environ.get("MXD_UNET_CACHE_GB")
+    if setting is not None:
+        return int(float(setting) * 1024 ** 3)
+    try:
+        import psutil
+        return int(psutil.virtual_memory().total * DEFAULT_BUDGET_FRACTION)
+    except ImportError:
+        return 0
+
+
+def file_signature(path: Path) -> tuple | None:
+    """(size, mtime, inode): a cached model is only reused while its file is unchanged."""
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return (st.st_size, st.st_mtime_ns, st.st_ino)
+
+
+class ModelCache:
+    def __init__(self, budget_bytes: int):
+        self.budget = budget_bytes
+        self._entries: OrderedDict = OrderedDict()  # key -> (model, size, signature)
+        self._lock = threading.Lock()
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, signature):
+        """The cached model for `key`, or None. A changed file signature drops the entry."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] != signature:
+                self._drop(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, model, size: int, signature) -> None:
+        """Caches a model, evicting older ones to stay within the budget. Too-big models are skipped."""
+        if size > self.budget:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (model, size, signature)
+            self.used += size
+            while self.used > self.budget:
+                self._drop(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _drop(self, key) -> None:
+        # Caller holds self._lock.
+        _, size, _ = self._entries.pop(key)
+        self.used -= size
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.used = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": [{"path": k[0], "weight_dtype": k[2], "bytes": v[1]} for k, v in self._entries.items()],
+                "used_bytes": self.used,
+                "budget_bytes": self.budget,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            }
+
+
+def model_size(model) -> int:
+    """Host bytes held by a loaded ComfyUI model (ModelPatcher), or its parameters as a fallback."""
+    if hasattr(model, "model_size"):
+        return int(model.model_size())
+    return sum(p.numel() * p.element_size() for p in model.parameters())
+
+
+unet_cache = ModelCache(_default_budget())
@@ -1,52 +1,39 @@
+import os
 import torch
 from pathlib import Path
 import folder_paths
 import comfy.sd
+import comfy.utils
+import comfy.model_management
 
 # Assuming these are in your project structure
-from .install_maxedout_nodes import get_model_files, download, MODEL_DIR
+from .catalog import unet_catalog, unet_availability, default_unet
+from .prefetch import prefetcher
+from .model_cache import unet_cache, file_signature, model_size
+from .fp8_cache import wants_conversion, load_state_dict as load_fp8_state_dict
+from .safetensors_index import safetensors_index
+
+try:
+    from aiohttp import web
+    from server import PromptServer
+except ImportError:  # imported outside a running ComfyUI server
+    PromptServer = None
+
+# What load_unet does when its model is still downloading in the background:
+#   auto   - wait, unless other prompts are queued; then fail fast so they can run
+#   always - always wait for the download
+#   never  - always fail fast (queue the prompt again once the download is done)
+PREFETCH_WAIT = os.environ.get("MXD_PREFETCH_WAIT", "auto")
 
 class MXD_UNETLoader:
     @classmethod
     def INPUT_TYPES(cls):
-        curated = get_model_files(schnell=True)
-        unet_choices = {}
-        
-        # Grouped buckets
-        fp8 = []
-        fp16 = []
-        
-        for path, local, sha in curated:
-            if not local.startswith("diffusion_models/"):
-                continue
-        
-            name = local.split("/")[-1]
-            if "-fp8" in name:
-                fp8.append((name, path, local, sha))
-            elif "-fp16" in name:
-                fp16.append((name, path, local, sha))
-        
-        # Build dict with headers
-        cls.UNET_CHOICES = {}
-        keys = []
-        
-        if fp8:
-            keys.append("— FP8 —")
-            cls.UNET_CHOICES["— FP8 —"] = None
-            for name, path, local, sha in sorted(fp8):
-                cls.UNET_CHOICES[name] = (path, local, sha)
-                keys.append(name)
-        
-        if fp16:
-            keys.append("— FP16 —")
-            cls.UNET_CHOICES["— FP16 —"] = None
-            for name, path, local, sha in sorted(fp16):
-                cls.UNET_CHOICES[name] = (path, local, sha)
-                keys.append(name)
-        
+        # Called for every /object_info request: the catalog is built once and
+        # only the (stat-cheap) default pick looks at the disk.
+        catalog = unet_catalog()
         return {
             "required": {
-                "unet_name": (keys, {"default": fp8[0][0] if fp8 else ""}),
+                "unet_name": (list(catalog.keys), {"default": default_unet()}),
                 "weight_dtype": (
                     ["default", "fp8_e4m3fn", "fp8_e4m3fn_fast", "fp8_e5m2"],
                 ),
@@ -65,6 +52,43 @@ class MXD_UNETLoader:
     FUNCTION = "load_unet"
     CATEGORY = "MaxedOut/Loaders"
 
+    @classmethod
+    def VALIDATE_INPUTS(cls, unet_name, auto_download):
+        # Runs when the prompt is queued, so a missing model starts downloading
+        # while earlier prompts are still executing.
+        entry = unet_catalog().choices.get(unet_name)
+        if entry is None:
+            return f"'{unet_name}' is not a valid UNET model."
+        if auto_download and not entry.local_path.exists():
+            prefetcher.request(unet_name, entry.hf_path, entry.local_path, entry.sha256)
+        return True
+
+    @staticmethod
+    def _others_queued():
+        if PromptServer is None:
+            return False
+        # Counts the running prompt (this one) plus everything still pending.
+        return PromptServer.instance.prompt_queue.get_tasks_remaining() > 1
+
+    @classmethod
+    def _wait_for(cls, job):
+        """Blocks until a background download finishes, mirroring it on the node's progress bar."""
+        if not job.done.is_set():
+            if PREFETCH_WAIT == "never" or (PREFETCH_WAIT == "auto" and cls._others_queued()):
+                pct = f" ({job.bytes_done / job.total:.0%})" if job.total else ""
+                raise RuntimeError(
+                    f"⏳ '{job.name}' is downloading in the background{pct}. This prompt was skipped "
+                    "so the rest of the queue can run. Queue it again once the download finishes."
+                )
+            print(f"⏳ Waiting for background download of {job.name} ...")
+            pbar = comfy.utils.ProgressBar(1)
+            while not job.done.wait(0.25):
+                comfy.model_management.throw_exception_if_processing_interrupted()
+                if job.total:
+                    pbar.update_absolute(job.bytes_done, job.total)
+        if job.state != "done":
+            raise RuntimeError(f"Downloading '{job.name}' failed: {job.error}")
+
     # --- MODIFIED FUNCTION SIGNATURE ---
     # Added 'auto_download' as a parameter to receive the toggle's state.
     def load_unet(self, unet_name, weight_dtype, auto_download):
@@ -79,21 +103,21 @@ class MXD_UNETLoader:
             model_options["dtype"] = torch.float8_e5m2
 
         # Resolve full HuggingFace path and expected hash
-        meta = self.UNET_CHOICES.get(unet_name)
-        if meta is None:
+        entry = unet_catalog().choices.get(unet_name)
+        if entry is None:
             raise ValueError(f"'{unet_name}' is a section header, not a valid UNET model.")
-        
-        hf_path, local_rel_path, expected_sha = meta
 
-        local_path = MODEL_DIR / local_rel_path
+        hf_path, expected_sha = entry.hf_path, entry.sha256
+        local_path = entry.local_path
 
         # --- MODIFIED DOWNLOAD LOGIC ---
         # Check if model exists
         if not local_path.exists():
             # If model is missing, check the state of the auto_download toggle
             if auto_download:
+                # Usually already queued by VALIDATE_INPUTS; runs on the prefetch thread.
                 print(f"🔽 Auto-download enabled. Downloading {unet_name} ...")
-                download(hf_path, local_path, expected_sha)
+                self._wait_for(prefetcher.request(unet_name, hf_path, local_path, expected_sha))
             else:
                 # If auto_download is OFF, raise an error instead of downloading
                 raise FileNotFoundError(
@@ -103,14 +127,93 @@ class MXD_UNETLoader:
         else:
             print(f"✅ {unet_name} found locally. Skipping download.")
 
+        # Header check: refuse an incomplete file up front instead of failing mid-load
+        info = safetensors_index.get(local_path) if local_path.suffix == ".safetensors" else None
+        if info is not None:
+            if info.truncated:
+                raise RuntimeError(
+                    f"Model '{unet_name}' is incomplete ({info.file_size} of {info.expected_size} bytes). "
+                    "Delete it and download it again."
+                )
+            need = info.estimated_bytes(1 if "dtype" in model_options else None)
+            print(f"📦 {unet_name}: {info.dtype}, {info.tensors} tensors, "
+                  f"{info.params / 1e9:.1f}B params, ~{need / 1024**3:.1f} GB of weights to load.")
+            try:
+                import psutil
+                free = psutil.virtual_memory().available
+                if need > free:
+                    print(f"⚠️ Only {free / 1024**3:.1f} GB of RAM is free; this load may swap or run out of memory.")
+            except ImportError:
+                pass
+
+        # Reuse a recently loaded copy if the file is unchanged
+        cache_key = (str(local_path), expected_sha, weight_dtype, bool(model_options.get("fp8_optimizations")))
+        signature = file_signature(local_path)
+        model = unet_cache.get(cache_key, signature)
+        if model is not None:
+            print(f"⚡ {unet_name} reused from the UNET cache (hits {unet_cache.hits}, misses {unet_cache.misses}).")
+            return (model,)
+
         # Load the UNET model using ComfyUI utils
         print("Loading UNET model...")
-        model = comfy.sd.load_diffusion_model(str(local_path), model_options=model_options)
+        if wants_conversion(local_path, weight_dtype, info):
+            sd, hit = load_fp8_state_dict(local_path, expected_sha, weight_dtype)
+            print(f"{'⚡ Read' if hit else '🔁 Converted'} fp8 weights for {unet_name}.")
+            model = comfy.sd.load_diffusion_model_state_dict(sd, model_options=model_options)
+            if model is None:
+                raise RuntimeError(f"ERROR: Could not detect model type of: {local_path}")
+        else:
+            model = comfy.sd.load_diffusion_model(str(local_path), model_options=model_options)
+        unet_cache.put(cache_key, model, model_size(model), signature)
         return (model,)
 
 ####################################################################################################################################################
 
 
+# PREFETCH API
+# POST /mxd/prefetch {"unet_name": ...} starts a background download (the web
+# extension calls it as soon as a model is picked); GET lists all jobs. Progress
+# is pushed over the websocket as "mxd.prefetch" events.
+if PromptServer is not None:
+    routes = PromptServer.instance.routes
+
+    @routes.post("/mxd/prefetch")
+    async def mxd_prefetch(request):
+        body = await request.json()
+        unet_name = body.get("unet_name")
+        entry = unet_catalog().choices.get(unet_name)
+        if entry is None:
+            return web.json_response({"error": f"unknown UNET '{unet_name}'"}, status=400)
+        job = prefetcher.request(unet_name, entry.hf_path, entry.local_path, entry.sha256)
+        return web.json_response(job.to_dict())
+
+    @routes.get("/mxd/prefetch")
+    async def mxd_prefetch_status(request):
+        return web.json_response(prefetcher.snapshot())
+
+    @routes.get("/mxd/unets")
+    async def mxd_unet_availability(request):
+        """
+        {name: {"state": "local" | "partial" | "missing", "bytes": n}} for the dropdown
+        hints; local entries also carry their safetensors header info (dtype, sizes).
+        """
+        status = unet_availability().refresh()
+        catalog = unet_catalog()
+        for name, entry in status.items():
+            if entry["state"] == "local":
+                info = safetensors_index.get(catalog.choices[name].local_path)
+                if info is not None:
+                    entry.update(info.to_dict())
+        return web.json_response(status)
+
+    @routes.get("/mxd/unet_cache")
+    async def mxd_unet_cache_stats(request):
+        return web.json_response(unet_cache.stats())
+
+    prefetcher.add_listener(lambda job: PromptServer.instance.send_sync("mxd.prefetch", job.to_dict()))
+
+
+
 # NODE MAPPING
 NODE_CLASS_MAPPINGS = {
     "MXD_UNETLoader": MXD_UNETLoader,
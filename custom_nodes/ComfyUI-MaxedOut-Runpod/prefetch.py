@@ -0,0 +1,118 @@
+from __future__ import annotations
+import os, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .install_maxedout_nodes import download, log
+
+# ── Background Prefetch ─────────────────────────────────────────────────────
+# Model downloads run on a background thread instead of ComfyUI's execution
+# thread, so a prompt queued behind a missing 20 GB UNET doesn't freeze
+# everything ahead of it. Jobs are keyed by local path; asking again for a file
+# that is queued or downloading returns the same job.
+
+# Files fetched at the same time (one keeps the full bandwidth on each file).
+PREFETCH_WORKERS = max(1, int(os.environ.get("MXD_PREFETCH_WORKERS", "1")))
+# How often progress is pushed to the browser.
+NOTIFY_INT = 0.5
+
+
+class PrefetchJob:
+    """One queued/running/finished download."""
+    def __init__(self, name: str, hf_path: str, local_path: Path, sha256: str):
+        self.name = name
+        self.hf_path = hf_path
+        self.local_path = local_path
+        self.sha256 = sha256
+        self.state = "queued"
+        self.bytes_done = 0
+        self.total: int | None = None
+        self.error: str | None = None
+        self.done = threading.Event()
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "state": self.state,
+            "bytes_done": self.bytes_done,
+            "total": self.total,
+            "error": self.error,
+        }
+
+
+class PrefetchService:
+    def __init__(self, workers: int = PREFETCH_WORKERS):
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mxd-prefetch")
+        self._jobs: dict[Path, PrefetchJob] = {}
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def add_listener(self, callback) -> None:
+        """`callback(job)` is called on every state change and at most every NOTIFY_INT while downloading."""
+        self._listeners.append(callback)
+
+    def _notify(self, job: PrefetchJob) -> None:
+        for callback in list(self._listeners):
+            try:
+                callback(job)
+            except Exception as e:
+                log(f"⚠️  Prefetch listener failed: {e}")
+
+    def request(self, name: str, hf_path: str, local_path: Path, sha256: str) -> PrefetchJob:
+        """Queues a download unless the file is already there or already queued. Returns its job."""
+        with self._lock:
+            job = self._jobs.get(local_path)
+            if job is not None and (job.state in ("queued", "downloading")
+                                    or (job.state == "done" and local_path.exists())):
+                return job
+            job = PrefetchJob(name, hf_path, local_path, sha256)
+            queued = not local_path.exists()
+            if queued:
+                self._pool.submit(self._run, job)
+            else:
+                job.state = "done"
+                job.done.set()
+            self._jobs[local_path] = job
+        if queued:
+            log(f"🔽 Queued background download of {name}")
+        self._notify(job)
+        return job
+
+    def get(self, local_path: Path) -> PrefetchJob | None:
+        with self._lock:
+            return self._jobs.get(local_path)
+
+    def snapshot(self) -> list[dict]:
+        with self._lock:
+            return [job.to_dict() for job in self._jobs.values()]
+
+    def _run(self, job: PrefetchJob) -> None:
+        last = 0.0
+
+        def _progress(done: int, total: int | None) -> None:
+            nonlocal last
+            job.bytes_done, job.total = done, total
+            now = time.monotonic()
+            if now - last >= NOTIFY_INT:
+                last = now
+                self._notify(job)
+
+        job.state = "downloading"
+        self._notify(job)
+        try:
+            download(job.hf_path, job.local_path, job.sha256, progress=_progress)
+            # download() reports failures through FAILED_FILES rather than raising.
+            if not job.local_path.exists():
+                raise IOError(f"download of {job.name} failed, see the ComfyUI log")
+            job.state = "done"
+            if job.total:
+                job.bytes_done = job.total
+        except Exception as e:
+            job.state, job.error = "failed", str(e)
+            log(f"❌ Background download of {job.name} failed: {e}")
+        finally:
+            job.done.set()
+            self._notify(job)
+
+
+prefetcher = PrefetchService()
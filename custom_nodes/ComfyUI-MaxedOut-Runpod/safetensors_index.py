@@ -0,0 +1,134 @@
+from __future__ import annotations
+import json, mmap, os, struct, threading
+from dataclasses import dataclass, field
+from pathlib import Path
+
+# ── Safetensors Header Index ────────────────────────────────────────────────
+# A .safetensors file starts with an 8-byte little-endian header length and a
+# JSON header giving every tensor's dtype, shape and byte range. Reading just
+# that (a few hundred KB at most) tells us the real dtype, size and whether the
+# file is complete, without touching the weights or hashing 20 GB.
+
+DTYPE_BYTES = {
+    "F64": 8, "F32": 4, "F16": 2, "BF16": 2, "F8_E4M3": 1, "F8_E5M2": 1,
+    "I64": 8, "I32": 4, "I16": 2, "I8": 1, "U64": 8, "U32": 4, "U16": 2, "U8": 1, "BOOL": 1,
+}
+# Anything bigger is not a real header (corrupt file or not safetensors at all).
+MAX_HEADER_BYTES = 100 * 1024 * 1024
+
+
+class HeaderError(ValueError):
+    """The file doesn't start with a valid safetensors header."""
+
+
+@dataclass(frozen=True)
+class SafetensorsInfo:
+    dtype: str | None                 # dtype holding the most bytes, e.g. "F16" or "F8_E4M3"
+    dtype_bytes: dict = field(default_factory=dict)  # dtype -> bytes of tensor data
+    tensors: int = 0
+    params: int = 0                   # total element count
+    param_bytes: int = 0              # bytes of tensor data the header describes
+    file_size: int = 0
+    expected_size: int = 0            # header + data, i.e. what a complete file measures
+    metadata: dict = field(default_factory=dict)
+
+    @property
+    def truncated(self) -> bool:
+        return self.file_size < self.expected_size
+
+    @property
+    def is_fp8(self) -> bool:
+        return bool(self.dtype and self.dtype.startswith("F8"))
+
+    def estimated_bytes(self, target_element_size: int | None = None) -> int:
+        """Memory for the weights, optionally with floating tensors cast to `target_element_size` bytes."""
+        if target_element_size is None:
+            return self.param_bytes
+        total = 0
+        for dtype, nbytes in self.dtype_bytes.items():
+            size = DTYPE_BYTES.get(dtype, 1)
+            total += nbytes * target_element_size // size if dtype.startswith(("F", "BF")) else nbytes
+        return total
+
+    def to_dict(self) -> dict:
+        return {
+            "dtype": self.dtype,
+            "tensors": self.tensors,
+            "params": self.params,
+            "param_bytes": self.param_bytes,
+            "file_size": self.file_size,
+            "truncated": self.truncated,
+        }
+
+
+def read_header(path: Path) -> SafetensorsInfo:
+    """Parses only the JSON header of a safetensors file (via mmap). Raises HeaderError."""
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < 8:
+            raise HeaderError(f"{path.name} is too small to be a safetensors file")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            (header_len,) = struct.unpack("<Q", mm[:8])
+            if header_len > MAX_HEADER_BYTES or 8 + header_len > size:
+                raise HeaderError(f"{path.name} has no complete safetensors header")
+            try:
+                header = json.loads(mm[8:8 + header_len])
+            except ValueError as e:
+                raise HeaderError(f"{path.name} has an unreadable safetensors header: {e}") from None
+
+    metadata = header.pop("__metadata__", None) or {}
+    dtype_bytes: dict[str, int] = {}
+    params = data_end = 0
+    for name, tensor in header.items():
+        try:
+            begin, end = tensor["data_offsets"]
+            count = 1
+            for dim in tensor["shape"]:
+                count *= dim
+        except (KeyError, TypeError, ValueError):
+            raise HeaderError(f"{path.name}: bad header entry for tensor '{name}'") from None
+        dtype_bytes[tensor["dtype"]] = dtype_bytes.get(tensor["dtype"], 0) + end - begin
+        params += count
+        data_end = max(data_end, end)
+
+    return SafetensorsInfo(
+        dtype=max(dtype_bytes, key=dtype_bytes.get) if dtype_bytes else None,
+        dtype_bytes=dtype_bytes,
+        tensors=len(header),
+        params=params,
+        param_bytes=sum(dtype_bytes.values()),
+        file_size=size,
+        expected_size=8 + header_len + data_end,
+        metadata=metadata,
+    )
+
+
+class SafetensorsIndex:
+    """Header info per file, cached by (size, mtime, inode) so unchanged files are never re-read."""
+    def __init__(self):
+        self._entries: dict[str, tuple[tuple, SafetensorsInfo | None]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: Path) -> SafetensorsInfo | None:
+        """Header info, or None if the file is missing or isn't a valid safetensors file."""
+        try:
+            st = path.stat()
+        except OSError:
+            return None
+        sig = (st.st_size, st.st_mtime_ns, st.st_ino)
+        key = str(path)
+        with self._lock:
+            cached = self._entries.get(key)
+        if cached and cached[0] == sig:
+            return cached[1]
+        try:
+            info = read_header(path)
+        except (OSError, HeaderError) as e:
+            print(f"⚠️ {e}")
+            info = None
+        with self._lock:
+            self._entries[key] = (sig, info)
+        return info
+
+
+safetensors_index = SafetensorsIndex()
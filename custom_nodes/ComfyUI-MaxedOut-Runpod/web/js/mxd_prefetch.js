@@ -0,0 +1,89 @@
+import { app } from "../../scripts/app.js";
+import { api } from "../../scripts/api.js";
+
+// Starts a background download as soon as a UNET is picked on an
+// MXD_UNETLoader with Auto-Download on, draws its progress on the node, and
+// shows whether the picked model is already on disk.
+
+const jobs = {}; // unet name -> latest "mxd.prefetch" event
+let availability = {}; // unet name -> {state: "local" | "partial" | "missing", bytes}
+
+const HINTS = {
+    local: ["● on disk", "#6c6"],
+    partial: ["◐ partly downloaded", "#db4"],
+    missing: ["○ not downloaded", "#999"],
+};
+
+async function refreshAvailability() {
+    try {
+        availability = await (await api.fetchApi("/mxd/unets")).json();
+        app.graph.setDirtyCanvas(true, false);
+    } catch {}
+}
+
+function widget(node, name) {
+    return node.widgets?.find((w) => w.name === name);
+}
+
+function prefetch(node) {
+    const unet = widget(node, "unet_name");
+    const auto = widget(node, "auto_download");
+    if (!unet || !auto?.value || !unet.value || unet.value.startsWith("—")) return;
+    api.fetchApi("/mxd/prefetch", {
+        method: "POST",
+        body: JSON.stringify({ unet_name: unet.value }),
+    }).catch(() => {});
+}
+
+app.registerExtension({
+    name: "MaxedOut.Prefetch",
+
+    setup() {
+        api.addEventListener("mxd.prefetch", ({ detail }) => {
+            jobs[detail.name] = detail;
+            if (detail.state === "done" || detail.state === "failed") refreshAvailability();
+            app.graph.setDirtyCanvas(true, false);
+        });
+        refreshAvailability();
+    },
+
+    nodeCreated(node) {
+        if (node.comfyClass !== "MXD_UNETLoader") return;
+
+        for (const name of ["unet_name", "auto_download"]) {
+            const w = widget(node, name);
+            if (!w) continue;
+            const callback = w.callback;
+            w.callback = function () {
+                const result = callback?.apply(this, arguments);
+                prefetch(node);
+                refreshAvailability();
+                return result;
+            };
+        }
+
+        const onDrawForeground = node.onDrawForeground;
+        node.onDrawForeground = function (ctx) {
+            onDrawForeground?.apply(this, arguments);
+            const name = widget(this, "unet_name")?.value;
+            const status = availability[name];
+            const hint = HINTS[status?.state];
+            if (hint) {
+                let text = hint[0];
+                if (status.truncated) text = "⚠ incomplete file";
+                else if (status.dtype) text += ` · ${status.dtype} · ${(status.param_bytes / 2 ** 30).toFixed(1)} GB`;
+                ctx.save();
+                ctx.font = "11px sans-serif";
+                ctx.textAlign = "right";
+                ctx.fillStyle = hint[1];
+                ctx.fillText(text, this.size[0] - 8, -8);
+                ctx.restore();
+            }
+            const job = jobs[name];
+            if (!job || job.state === "done") return;
+            const fraction = job.state === "failed" ? 1 : job.total ? job.bytes_done / job.total : 0;
+            ctx.fillStyle = job.state === "failed" ? "#a33" : "#2a7";
+            ctx.fillRect(0, this.size[1] - 4, this.size[0] * fraction, 4);
+        };
+    },
+});
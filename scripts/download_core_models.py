@@ -1,7 +1,6 @@
 # ─── Imports ────────────────────────────────────────────────────────────────
-from install_maxedout import download, MODEL_DIR
-from tqdm.auto import tqdm
-from pathlib import Path
+import sys
+from install_maxedout import download_by_tier, FAILED_FILES, MAX_WORKERS
 
 # ─── Files To Download ─────────────────────────────────────────────────────────────
 FILES = [
@@ -20,15 +19,17 @@ FILES = [
 # ─── Main Function ─────────────────────────────────────────────────────────────
 def main():
     print("--- Starting Core Model Download ---")
-    total_files = len(FILES)
+    print(f"Downloading {len(FILES)} files, {MAX_WORKERS} at a time...")
 
-    for i, (remote, local, sha256) in enumerate(FILES):
-        # This provides a clean, single-line status in the main log
-        print(f"[{i + 1}/{total_files}] Downloading {Path(local).name}...")
-        # We hide the detail bar to keep the main log uncluttered
-        download(remote, MODEL_DIR / local, sha256, show_progress=False)
+    # Text encoders/VAE first, then the UNET, then upscalers/detectors (see MXD_READY_FILE).
+    # We hide the detail bars to keep the main log uncluttered
+    download_by_tier(FILES, show_progress=False)
 
+    for remote, reason in FAILED_FILES:
+        print(f"❌ Failed: {remote} ({reason})")
     print("--- Core Model Download Complete ---")
+    if FAILED_FILES:
+        sys.exit(1)  # start.sh only marks the install done on success, so the next boot retries
 
 # ─── Entry Point ─────────────────────────────────────────────────────────────
 if __name__ == "__main__":
@@ -1,10 +1,21 @@
 #!/usr/bin/env python
 
 from __future__ import annotations
-import sys, subprocess, time, atexit, signal, requests, hashlib
+import os, sys, json, mmap, shutil, asyncio, threading, subprocess, time, atexit, signal, requests, hashlib
+import errno, urllib3
+from dataclasses import dataclass
+from contextlib import contextmanager
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable
 from pathlib import Path
 from tqdm.auto import tqdm
 
+try:
+    import fcntl
+except ImportError:  # non-POSIX: fall back to in-process locking only
+    fcntl = None
+
 # --- Configuration for RunPod ---
 # Set to True to also download the faster, lower-quality Schnell model.
 DOWNLOAD_SCHNELL = True
@@ -17,8 +28,17 @@ BASE_URL = (
     f"/resolve/{HF_COMMIT}"
 )
 MODEL_DIR = Path("/workspace/ComfyUI/models")
+# Ordered download sources, tried first to last with failover. Each entry is a
+# local directory / mounted cache volume (plain path or file://...), an HTTP(S)
+# mirror with the same layout as BASE_URL, or "hf" for BASE_URL itself.
+# Example: MXD_SOURCES="/mnt/model-cache,http://10.0.0.5:8080/flux,hf"
+SOURCES = [x.strip() for x in os.environ.get("MXD_SOURCES", "hf").split(",") if x.strip()]
+# Copy files fetched from a remote source back into the first local-directory source.
+CACHE_WRITE_BACK = os.environ.get("MXD_CACHE_WRITE_BACK", "0") == "1"
 LOG_DIR = Path("install_logs_mxd")
 TEST_MODE = "--test" in sys.argv
+# Re-hash every existing file instead of trusting the verified-hash manifest.
+DEEP_VERIFY = "--deep-verify" in sys.argv
 
 # --- Stream redirection for logging ---
 _orig_stdout = sys.stdout
@@ -26,11 +46,28 @@ _orig_stderr = sys.stderr
 user_cancelled: bool = False
 
 # --- Constants ---
-CHUNK = 8192
+# I/O buffer per storage backend. Network volumes favour fewer, larger writes;
+# local NVMe is fine with smaller ones. Force a backend with MXD_STORAGE=network|local
+# or an exact size in bytes with MXD_IO_BUFFER.
+IO_BUFFERS = {"network": 8 * 1024 * 1024, "local": 1024 * 1024}
+NETWORK_FS_PREFIXES = ("nfs", "fuse", "cifs", "smb", "ceph", "9p", "lustre", "glusterfs")
 TIMEOUT = 60
 RETRIES = 3
 PROG_INT = 0.1
 LOG_DELAY = 0  # Set to 0 for fast, non-interactive logging.
+# Number of files downloaded at the same time (override with MXD_DOWNLOAD_WORKERS).
+MAX_WORKERS = max(1, int(os.environ.get("MXD_DOWNLOAD_WORKERS", "4")))
+# Files at least this big are fetched as parallel byte ranges (segments).
+SEGMENT_THRESHOLD = 512 * 1024 * 1024
+SEGMENT_SIZE = 64 * 1024 * 1024
+# Parallel range requests per segmented file (override with MXD_SEGMENT_WORKERS, 1 disables).
+SEGMENT_WORKERS = max(1, int(os.environ.get("MXD_SEGMENT_WORKERS", "4")))
+# Machine-readable progress: a small JSON file, atomically replaced at most every
+# PROGRESS_FILE_INT seconds (and on every file finishing). Empty disables it.
+PROGRESS_FILE = os.environ.get("MXD_PROGRESS_FILE", "/workspace/logs/mxd_progress.json")
+PROGRESS_FILE_INT = 0.5
+# MXD_PROGRESS_BARS=0 turns off the tqdm DETAIL bars in the human-readable log.
+PROGRESS_BARS = os.environ.get("MXD_PROGRESS_BARS", "1") != "0"
 FAILED_FILES = []
 
 # ── Graceful Exit Handler ───────────────────────────────────────────────────
@@ -38,7 +75,8 @@ def handle_interrupt(sig, frame):
     """SIGINT handler – mark cancel, flush logs, exit fast."""
     global user_cancelled
     user_cancelled = True
-    _orig_stdout.write("\n🟥 Installer cancelled by user. Partial downloads may remain.\n")
+    _cancel_event.set()
+    _orig_stdout.write("\n🟥 Installer cancelled by user. Partial downloads are kept and will resume.\n")
     try:
         _orig_stdout.flush()
         _orig_stderr.flush()
@@ -54,34 +92,543 @@ signal.signal(signal.SIGINT, handle_interrupt)
 def log(msg: str, **kwargs) -> None:
     print(msg, flush=True)
 
+# ── Progress Events ─────────────────────────────────────────────────────────
+@dataclass(frozen=True)
+class ProgressEvent:
+    """
+    Snapshot of one file's progress, or of the whole queue when name == "OVERALL".
+    state is one of: queued, downloading, done, skipped, failed, cancelled.
+    """
+    name: str
+    state: str
+    bytes_done: int = 0
+    total: int | None = None
+    rate: float = 0.0           # bytes per second since this transfer started
+    eta: float | None = None    # seconds, when total and rate are known
+    files_done: int | None = None
+    files_total: int | None = None
+
+_subscribers: list[Callable[[ProgressEvent], None]] = []
+_subscribers_lock = threading.Lock()
+
+def subscribe(callback: Callable[[ProgressEvent], None]) -> Callable[[], None]:
+    """Registers a progress listener and returns a function that removes it."""
+    with _subscribers_lock:
+        _subscribers.append(callback)
+    def _unsubscribe() -> None:
+        with _subscribers_lock:
+            if callback in _subscribers:
+                _subscribers.remove(callback)
+    return _unsubscribe
+
+def _emit(event: ProgressEvent) -> None:
+    with _subscribers_lock:
+        listeners = list(_subscribers)
+    for callback in listeners:
+        try:
+            callback(event)
+        except Exception as e:
+            log(f"⚠️  Progress listener failed: {e}")
+
+class _FileProgress:
+    """Feeds byte counts to the tqdm DETAIL bar (optional) and to progress subscribers."""
+    def __init__(self, name: str, total: int | None, initial: int = 0, show_bar: bool = True,
+                 bar_label: str | None = None):
+        self.name, self.total, self.done = name, total, initial
+        self._start, self._start_bytes, self._last = time.monotonic(), initial, 0.0
+        self._lock = threading.Lock()
+        self._bar = None
+        if show_bar and PROGRESS_BARS:
+            self._bar = tqdm(
+                desc=f"   DETAIL:: {bar_label or name}",
+                total=total, initial=initial, unit='B', unit_scale=True,
+                unit_divisor=1024, mininterval=PROG_INT, ncols=80, ascii=" #",
+                bar_format='{l_bar}{bar:25}{r_bar}'
+            )
+        self._publish(force=True)
+
+    def update(self, n: int) -> None:
+        with self._lock:
+            self.done += n
+            if self._bar is not None:
+                self._bar.update(n)
+        self._publish()
+
+    def _publish(self, force: bool = False) -> None:
+        now = time.monotonic()
+        if not force and now - self._last < PROG_INT:
+            return
+        self._last = now
+        elapsed = max(now - self._start, 1e-6)
+        rate = (self.done - self._start_bytes) / elapsed
+        eta = (self.total - self.done) / rate if self.total and rate > 0 else None
+        _emit(ProgressEvent(self.name, "downloading", self.done, self.total, rate, eta))
+
+    def close(self) -> None:
+        self._publish(force=True)
+        if self._bar is not None:
+            self._bar.close()
+        with _transferred_lock:
+            _transferred[self.name] = _transferred.get(self.name, 0) + self.done - self._start_bytes
+
+# ── Metrics ─────────────────────────────────────────────────────────────────
+# Counters, gauges and histograms read by the unlock server's /metrics endpoint.
+# Each process keeps the changes since its last flush and merges them into
+# METRICS_FILE under a file lock, so concurrent installers add up correctly.
+METRICS_FILE = Path(os.environ.get("MXD_METRICS_FILE", "/workspace/logs/mxd_metrics.json"))
+RATE_BUCKETS = (1e6, 5e6, 10e6, 25e6, 50e6, 100e6, 250e6, 500e6, 1e9)  # bytes per second
+_metrics: dict = {"counters": {}, "gauges": {}, "histograms": {}}
+_metrics_lock = threading.Lock()
+
+def _labels(**labels) -> str:
+    """Prometheus label set body, e.g. 'source="hf"'."""
+    return ",".join(f"{k}={json.dumps(str(v), ensure_ascii=False)}" for k, v in sorted(labels.items()))
+
+def _count(name: str, value: float = 1, **labels) -> None:
+    with _metrics_lock:
+        series = _metrics["counters"].setdefault(name, {})
+        key = _labels(**labels)
+        series[key] = series.get(key, 0) + value
+
+def _gauge(name: str, value: float, **labels) -> None:
+    with _metrics_lock:
+        _metrics["gauges"].setdefault(name, {})[_labels(**labels)] = value
+
+def _observe(name: str, value: float, buckets: tuple, **labels) -> None:
+    with _metrics_lock:
+        hist = _metrics["histograms"].setdefault(name, {}).setdefault(
+            _labels(**labels), {"le": list(buckets), "counts": [0] * len(buckets), "sum": 0, "count": 0})
+        for i, le in enumerate(hist["le"]):
+            if value <= le:
+                hist["counts"][i] += 1
+        hist["sum"] += value
+        hist["count"] += 1
+
+def _merge_metrics(into: dict, delta: dict) -> None:
+    for name, series in delta["counters"].items():
+        target = into.setdefault("counters", {}).setdefault(name, {})
+        for key, value in series.items():
+            target[key] = target.get(key, 0) + value
+    for name, series in delta["gauges"].items():
+        into.setdefault("gauges", {}).setdefault(name, {}).update(series)
+    for name, series in delta["histograms"].items():
+        target = into.setdefault("histograms", {}).setdefault(name, {})
+        for key, hist in series.items():
+            old = target.get(key)
+            if old is None or old["le"] != hist["le"]:
+                target[key] = hist
+                continue
+            old["counts"] = [a + b for a, b in zip(old["counts"], hist["counts"])]
+            old["sum"] += hist["sum"]
+            old["count"] += hist["count"]
+
+def flush_metrics() -> None:
+    """Merges this process's pending metrics into METRICS_FILE (atomically replaced)."""
+    global _metrics
+    with _metrics_lock:
+        delta = _metrics
+        _metrics = {"counters": {}, "gauges": {}, "histograms": {}}
+    if not any(delta.values()):
+        return
+    try:
+        METRICS_FILE.parent.mkdir(parents=True, exist_ok=True)
+        with open(METRICS_FILE.with_name(METRICS_FILE.name + ".lock"), "a") as lock_fp:
+            if fcntl is not None:
+                fcntl.flock(lock_fp, fcntl.LOCK_EX)
+            try:
+                data = json.loads(METRICS_FILE.read_text())
+            except (OSError, ValueError):
+                data = {}
+            _merge_metrics(data, delta)
+            data["updated"] = time.time()
+            tmp = METRICS_FILE.with_name(f"{METRICS_FILE.name}.{os.getpid()}.tmp")
+            tmp.write_text(json.dumps(data))
+            os.replace(tmp, METRICS_FILE)
+    except OSError as e:
+        log(f"⚠️  Could not write metrics to {METRICS_FILE}: {e}")
+
+def _record_result(event: ProgressEvent) -> None:
+    if event.name != "OVERALL" and event.state in ("done", "skipped", "failed", "cancelled"):
+        _count("mxd_files_total", result=event.state)
+
+subscribe(_record_result)
+atexit.register(flush_metrics)
+
+# ── Progress State File ─────────────────────────────────────────────────────
+class _ProgressStateFile:
+    """
+    Progress subscriber that mirrors the latest per-file and OVERALL events into
+    PROGRESS_FILE as JSON, so the unlock server and ComfyUI can read progress
+    without parsing the log. Writes are throttled; finished files flush at once.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        self.files: dict[str, dict] = {}
+        self.overall: dict = {}
+        self.last_finished: dict | None = None
+        self._lock = threading.Lock()
+        self._written = 0.0
+        self.disabled = False
+
+    def __call__(self, event: ProgressEvent) -> None:
+        entry = {"state": event.state, "bytes_done": event.bytes_done, "total": event.total,
+                 "rate": round(event.rate), "eta": round(event.eta) if event.eta is not None else None}
+        with self._lock:
+            if event.name == "OVERALL":
+                entry.update(files_done=event.files_done, files_total=event.files_total)
+                urgent = event.files_done != self.overall.get("files_done")
+                self.overall = entry
+            else:
+                self.files[event.name] = entry
+                urgent = event.state in ("done", "skipped", "failed", "cancelled")
+                if urgent:
+                    self.last_finished = {"name": event.name, "state": event.state}
+            if urgent or time.monotonic() - self._written >= PROGRESS_FILE_INT:
+                self._write()
+
+    def _write(self, final: bool = False) -> None:
+        # Caller holds self._lock.
+        if self.disabled:
+            return
+        self._written = time.monotonic()
+        state = "done" if final else self.overall.get("state", "downloading")
+        if _cancel_event.is_set():
+            state = "cancelled"
+        data = {"pid": os.getpid(), "updated": time.time(), "state": state, "overall": self.overall,
+                "last_finished": self.last_finished, "files": self.files}
+        tmp = self.path.with_name(f"{self.path.name}.{os.getpid()}.tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp.write_text(json.dumps(data))
+            os.replace(tmp, self.path)
+        except OSError as e:
+            log(f"⚠️  Could not write progress to {self.path}: {e}. Progress file disabled.")
+            self.disabled = True
+
+    def close(self) -> None:
+        with self._lock:
+            self._write(final=True)
+
+# Bytes moved by finished _FileProgress trackers, per file name, since the source attempt started.
+_transferred: dict[str, int] = {}
+_transferred_lock = threading.Lock()
+
 # ── Core Utility Functions ──────────────────────────────────────────────────
+@lru_cache(maxsize=None)
+def _storage_backend(directory: str) -> str:
+    """'network' or 'local' for the filesystem holding `directory` (from /proc/mounts)."""
+    forced = os.environ.get("MXD_STORAGE", "").lower()
+    if forced in IO_BUFFERS:
+        return forced
+    best, fstype = "", ""
+    try:
+        with open("/proc/mounts") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) >= 3 and (directory == parts[1] or directory.startswith(parts[1].rstrip("/") + "/")):
+                    if len(parts[1]) > len(best):
+                        best, fstype = parts[1], parts[2]
+    except OSError:
+        pass
+    return "network" if fstype.startswith(NETWORK_FS_PREFIXES) else "local"
+
+def _io_buffer_size(path: Path) -> int:
+    """Read/write buffer size for files under `path`."""
+    override = os.environ.get("MXD_IO_BUFFER", "")
+    if override.isdigit() and int(override) > 0:
+        return int(override)
+    return IO_BUFFERS[_storage_backend(str(path.resolve().parent))]
+
+_buffers = threading.local()
+
+def _io_buffer(size: int) -> memoryview:
+    """Per-thread reusable buffer, so streaming doesn't allocate a bytes object per chunk."""
+    buf = getattr(_buffers, "buf", None)
+    if buf is None or len(buf) != size:
+        buf = _buffers.buf = bytearray(size)
+    return memoryview(buf)
+
+def _iter_body(r, buf: memoryview):
+    """Yields slices of `buf` filled straight from the response socket with readinto."""
+    if r.headers.get("Content-Encoding", "identity") != "identity":
+        yield from r.iter_content(chunk_size=len(buf))
+        return
+    # r.raw is urllib3's response: map its errors the way iter_content does, so a
+    # connection dropped mid-body reaches the failover handling as a requests error.
+    try:
+        while n := r.raw.readinto(buf):
+            yield buf[:n]
+    except urllib3.exceptions.ReadTimeoutError as e:
+        raise requests.ConnectionError(e) from e
+    except urllib3.exceptions.ProtocolError as e:
+        raise requests.exceptions.ChunkedEncodingError(e) from e
+
+def _preallocate(fd: int, size: int) -> None:
+    """Reserves `size` bytes for the file up front (falls back to a sparse truncate)."""
+    try:
+        os.posix_fallocate(fd, 0, size)
+    except (AttributeError, OSError):
+        os.ftruncate(fd, size)
+
+def _hash_mapped(sha256, file_path: Path, length: int | None = None) -> None:
+    """Feeds the first `length` bytes (default: all) of a file into a hasher via mmap."""
+    size = file_path.stat().st_size
+    length = size if length is None else length
+    if length > size:
+        raise IOError(f"{file_path.name} is shorter than expected while hashing")
+    if length == 0:
+        return
+    step = _io_buffer_size(file_path)
+    with open(file_path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if hasattr(mm, "madvise"):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        view = memoryview(mm)
+        try:
+            for pos in range(0, length, step):
+                sha256.update(view[pos:min(pos + step, length)])
+        finally:
+            view.release()
+
 def _get_local_sha256(file_path: Path) -> str | None:
     """Calculates the SHA256 hash of a local file."""
     if not file_path.exists():
         return None
     sha256 = hashlib.sha256()
+    started = time.perf_counter()
     try:
-        with open(file_path, "rb") as f:
-            while chunk := f.read(CHUNK):
-                sha256.update(chunk)
+        _hash_mapped(sha256, file_path)
         return sha256.hexdigest()
-    except IOError as e:
+    except (IOError, ValueError) as e:
         log(f"⚠️  Could not read file for hashing: {file_path.name} - {e}")
         return None
+    finally:
+        _count("mxd_hash_seconds_total", time.perf_counter() - started, phase="verify")
+
+def _safetensors_truncated(file_path: Path) -> bool:
+    """
+    True when a .safetensors file is shorter than its own header says (an
+    interrupted copy). Reads only the header, so it's instant even on 20 GB files.
+    """
+    if file_path.suffix != ".safetensors":
+        return False
+    try:
+        with open(file_path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            header_len = int.from_bytes(f.read(8), "little")
+            if size < 8 or 8 + header_len > size:
+                return True
+            header = json.loads(f.read(header_len))
+        header.pop("__metadata__", None)
+        data_end = max((t["data_offsets"][1] for t in header.values()), default=0)
+    except (OSError, ValueError, KeyError, TypeError, IndexError, AttributeError):
+        return False  # not something we can judge; leave it to the hash check
+    return size < 8 + header_len + data_end
+
+def _hash_prefix(sha256, file_path: Path, length: int) -> None:
+    """Feeds the first `length` bytes of a file into an existing hasher."""
+    started = time.perf_counter()
+    _hash_mapped(sha256, file_path, length)
+    _count("mxd_hash_seconds_total", time.perf_counter() - started, phase="resume")
+
+_http: requests.Session | None = None
+_http_lock = threading.Lock()
+
+def _session() -> requests.Session:
+    """Shared keep-alive session, pooled for every file and segment worker."""
+    global _http
+    with _http_lock:
+        if _http is None:
+            _http = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(
+                pool_connections=8, pool_maxsize=MAX_WORKERS * SEGMENT_WORKERS + 4)
+            _http.mount("https://", adapter)
+            _http.mount("http://", adapter)
+    return _http
+
+def _total_size(r) -> int | None:
+    """Full remote file size from a GET response (Content-Range total or Content-Length)."""
+    content_range = r.headers.get("Content-Range", "")
+    if r.status_code == 206 and "/" in content_range:
+        total = content_range.rsplit("/", 1)[1]
+        return int(total) if total.isdigit() else None
+    cl = r.headers.get("Content-Length")
+    return int(cl) if cl and cl.isdigit() else None
+
+# ── Verified-Hash Manifest ─────────────────────────────────────────────────
+# Records (size, mtime, inode, sha256) for every file we have verified, so an
+# unchanged file is trusted on later runs without re-reading it.
+_manifest_lock = threading.Lock()
+
+def _manifest_path() -> Path:
+    return MODEL_DIR / ".mxd_manifest.json"
+
+def _manifest_key(file_path: Path) -> str:
+    try:
+        return file_path.relative_to(MODEL_DIR).as_posix()
+    except ValueError:
+        return str(file_path)
+
+def _load_manifest() -> dict:
+    try:
+        return json.loads(_manifest_path().read_text())
+    except (OSError, ValueError):
+        return {}
+
+def _stat_entry(file_path: Path) -> dict:
+    st = file_path.stat()
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "inode": st.st_ino}
+
+def _manifest_lookup(file_path: Path) -> str | None:
+    """Returns the recorded sha256 if the file's stat tuple still matches the manifest."""
+    entry = _load_manifest().get(_manifest_key(file_path))
+    if not entry:
+        return None
+    try:
+        current = _stat_entry(file_path)
+    except OSError:
+        return None
+    if any(entry.get(k) != v for k, v in current.items()):
+        return None
+    return entry.get("sha256")
 
-def _remote_size(url: str) -> int | None:
-    """Gets the size of a remote file."""
-    for attempt in range(RETRIES):
+def _manifest_update(file_path: Path, sha256: str | None) -> None:
+    """Records (or with sha256=None, forgets) a verified file. Safe across threads and processes."""
+    with _manifest_lock:
+        path = _manifest_path()
         try:
-            h = requests.head(url, allow_redirects=True, timeout=TIMEOUT)
-            cl = h.headers.get("Content-Length")
-            if cl and cl.isdigit():
-                return int(cl)
-        except Exception:
-            log(f"⚠️  HEAD request failed (attempt {attempt+1}/{RETRIES}) for size check.")
-            time.sleep(2 * 2**attempt)
-    log("🚫 Failed to get remote file size after multiple attempts.")
-    return None
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # The core download, ComfyUI's node downloader and power-user jobs share
+            # this manifest; the flock keeps them from dropping each other's entries.
+            with open(path.with_name(path.name + ".lock"), "a") as lock_fp:
+                if fcntl is not None:
+                    fcntl.flock(lock_fp, fcntl.LOCK_EX)
+                manifest = _load_manifest()
+                key = _manifest_key(file_path)
+                if sha256 is None:
+                    if manifest.pop(key, None) is None:
+                        return
+                else:
+                    manifest[key] = {**_stat_entry(file_path), "sha256": sha256.lower()}
+                tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+                tmp.write_text(json.dumps(manifest, indent=1, sort_keys=True))
+                os.replace(tmp, path)
+        except OSError as e:
+            log(f"⚠️  Could not update hash manifest: {e}")
+
+# ── Content-Addressed Blob Store ───────────────────────────────────────────
+# Every verified file lives once under <blob dir>/sha256/<ab>/<sha256>; the
+# ComfyUI model paths are hardlinks (or symlinks across filesystems) to it.
+# MXD_BLOB_DIR can point at a shared cache volume to repopulate a pod by linking.
+_blob_thread_locks: dict[str, threading.Lock] = {}
+_blob_thread_locks_guard = threading.Lock()
+
+def _blob_dir() -> Path:
+    return Path(os.environ.get("MXD_BLOB_DIR") or MODEL_DIR / ".blobs")
+
+def _blob_path(sha256: str) -> Path:
+    sha256 = sha256.lower()
+    return _blob_dir() / "sha256" / sha256[:2] / sha256
+
+@contextmanager
+def _blob_lock(sha256: str):
+    """Serialises work on one hash across threads and processes (installer + custom node)."""
+    sha256 = sha256.lower()
+    with _blob_thread_locks_guard:
+        thread_lock = _blob_thread_locks.setdefault(sha256, threading.Lock())
+    with thread_lock:
+        if fcntl is None:
+            yield
+            return
+        lock_path = _blob_path(sha256).with_suffix(".lock")
+        lock_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(lock_path, "a") as fp:
+            fcntl.flock(fp.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fp.fileno(), fcntl.LOCK_UN)
+
+def _blob_ready(sha256: str) -> bool:
+    """True if the blob for `sha256` exists and is verified (via manifest or a full hash)."""
+    blob = _blob_path(sha256)
+    if not blob.is_file():
+        return False
+    if not DEEP_VERIFY and _manifest_lookup(blob) == sha256.lower():
+        return True
+    actual = _get_local_sha256(blob)
+    if actual and actual.lower() == sha256.lower():
+        _manifest_update(blob, actual)
+        return True
+    log(f"⚠️ Blob {blob.name[:12]}… is corrupt. Removing it.")
+    _manifest_update(blob, None)
+    blob.unlink(missing_ok=True)
+    return False
+
+def _link_from_blob(sha256: str, local_path: Path) -> None:
+    """Materialises `local_path` as a hardlink to the blob, or a symlink across filesystems."""
+    blob = _blob_path(sha256)
+    tmp = local_path.with_name(local_path.name + ".link")
+    tmp.unlink(missing_ok=True)
+    try:
+        os.link(blob, tmp)
+    except OSError:
+        os.symlink(blob, tmp)
+    os.replace(tmp, local_path)
+
+def _copy_into_blob(src: Path, sha256: str) -> None:
+    """Copies a verified file into a blob store on another filesystem (temp file, then rename)."""
+    blob = _blob_path(sha256)
+    tmp = blob.with_name(f"{blob.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, blob)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    _manifest_update(blob, sha256)
+
+def _adopt_into_blob(local_path: Path, sha256: str) -> None:
+    """
+    Registers an already-verified model file in the blob store: a hardlink, or
+    when an explicit MXD_BLOB_DIR is on another filesystem, a copy there that
+    the model path is then linked to. The default in-tree store never copies.
+    """
+    blob = _blob_path(sha256)
+    if blob.exists() or local_path.is_symlink():
+        return
+    try:
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        os.link(local_path, blob)
+        _manifest_update(blob, sha256)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV or not os.environ.get("MXD_BLOB_DIR"):
+            return  # keep the plain file
+    try:
+        _copy_into_blob(local_path, sha256)
+        _link_from_blob(sha256, local_path)
+    except OSError as e:
+        log(f"⚠️  Could not copy {local_path.name} into the blob store: {e}")
+
+def _store_verified(tmp_path: Path, local_path: Path, sha256: str) -> None:
+    """Moves a verified .part into the blob store and links the model path to it."""
+    blob = _blob_path(sha256)
+    try:
+        blob.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(tmp_path, blob)
+    except OSError as e:
+        try:
+            if e.errno != errno.EXDEV:
+                raise
+            # Blob store on another filesystem (a shared cache volume): copy it there.
+            _copy_into_blob(tmp_path, sha256)
+        except OSError as err:
+            log(f"⚠️  Could not store {local_path.name} in the blob store: {err}")
+            tmp_path.rename(local_path)  # keep the file at its model path
+            return
+        tmp_path.unlink()
+    _manifest_update(blob, sha256)
+    _link_from_blob(sha256, local_path)
 
 # ── Dependency Installation ────────────────────────────────────────────────
 def install_pip_package(package_name: str, install_args: list[str] = None):
@@ -142,43 +689,490 @@ def clone_custom_nodes():
         FAILED_FILES.append(("custom_nodes/ComfyUI-MaxedOut", "Initial Git clone failed"))
 
 # ── File Downloading Logic ────────────────────────────────────────────────
-def _download_once(url: str, tmp_path: Path, resume: bool = False, show_progress: bool = True) -> int:
+class RangeNotSupported(IOError):
+    """Raised when the server answers a Range request with the full body."""
+
+class DownloadCancelled(Exception):
+    """Raised inside download workers once the user has pressed Ctrl+C."""
+
+class CorruptDownload(IOError):
+    """The finished .part doesn't match the expected size or SHA256 and can't be resumed."""
+
+# Set by handle_interrupt so every worker stops at its next chunk and checkpoints.
+_cancel_event = threading.Event()
+# How often (in bytes) a single-stream download records its validated length.
+CHECKPOINT_BYTES = 64 * 1024 * 1024
+# Live hashers for interrupted single-stream downloads: tmp_path -> (length, sha256).
+# Lets a retry in the same process continue hashing without re-reading the prefix.
+_stream_hashers: dict = {}
+
+def _sidecar_path(tmp_path: Path) -> Path:
+    """Sidecar file that records how much of a .part file is valid and for which ETag."""
+    return tmp_path.with_name(tmp_path.name + ".json")
+
+def _clear_partial(tmp_path: Path) -> None:
+    """Removes a .part file and its sidecar, if present."""
+    _stream_hashers.pop(tmp_path, None)
+    for p in (tmp_path, _sidecar_path(tmp_path)):
+        try:
+            p.unlink()
+        except FileNotFoundError:
+            pass
+
+def _load_sidecar(tmp_path: Path, url: str) -> dict:
+    """Returns the saved resume state, or {} if it is missing or for another URL."""
+    try:
+        state = json.loads(_sidecar_path(tmp_path).read_text())
+    except (OSError, ValueError):
+        return {}
+    if state.get("url") != url or not tmp_path.exists():
+        return {}
+    return state
+
+def _save_sidecar(tmp_path: Path, state: dict) -> None:
+    """Atomically persists resume state next to the .part file."""
+    side = _sidecar_path(tmp_path)
+    tmp_side = side.with_name(side.name + ".tmp")
+    tmp_side.write_text(json.dumps(state))
+    os.replace(tmp_side, side)
+
+def _strong_etag(r) -> str | None:
+    """ETag usable for If-Range (weak validators are not allowed there)."""
+    etag = r.headers.get("ETag")
+    return etag if etag and not etag.startswith("W/") else None
+
+def _download_segmented(url: str, tmp_path: Path, total_size: int, show_progress: bool = True,
+                        source_url: str | None = None, name: str | None = None) -> tuple[int, str]:
+    """
+    Fetches a large file as parallel byte ranges written at their offsets into a
+    preallocated .part file. Completed segments and the ETag are recorded in a
+    sidecar so a retry (or a restarted process) only re-fetches the missing ones.
+    `source_url` is the already-resolved (post-redirect) URL, when known, so the
+    segment requests skip the redirect hop.
+
+    The SHA256 is built in file order: the segment at the hash frontier is fed
+    straight from the receive buffer as it streams in, so normally only
+    segments that finished ahead of the frontier are read back from disk.
+    Returns (size, sha256 hex digest).
+    """
+    count = (total_size + SEGMENT_SIZE - 1) // SEGMENT_SIZE
+    state = _load_sidecar(tmp_path, url)
+    if (state.get("mode") != "segments" or state.get("size") != total_size
+            or state.get("segment_size") != SEGMENT_SIZE
+            or tmp_path.stat().st_size != total_size):
+        _clear_partial(tmp_path)
+        with open(tmp_path, "wb") as f:
+            _preallocate(f.fileno(), total_size)
+        state = {"mode": "segments", "url": url, "size": total_size,
+                 "segment_size": SEGMENT_SIZE, "etag": None, "done": []}
+        _save_sidecar(tmp_path, state)
+    done = set(state["done"])
+
+    def _persist() -> None:
+        state["done"] = sorted(done)
+        _save_sidecar(tmp_path, state)
+
+    pending = [i for i in range(count) if i not in done]
+    lock = threading.Lock()
+    failed = threading.Event()
+    progress = _FileProgress(
+        name or tmp_path.name, total_size, show_bar=show_progress, bar_label=tmp_path.name,
+        initial=total_size - sum(min(SEGMENT_SIZE, total_size - i * SEGMENT_SIZE) for i in pending))
+
+    fd = os.open(tmp_path, os.O_RDWR)
+    sha256 = hashlib.sha256()
+    hash_lock = threading.Lock()
+    hashed = [0]  # index of the next segment to feed into sha256
+    buf_size = _io_buffer_size(tmp_path)
+    hash_buf = memoryview(bytearray(buf_size))
+
+    def _hash_range(pos: int, end: int) -> None:
+        # Reads [pos, end) back from the .part into sha256. Caller holds hash_lock.
+        started = time.perf_counter()
+        while pos < end:
+            n = os.preadv(fd, [hash_buf[:end - pos]], pos)
+            if not n:
+                raise IOError(f"Short read while hashing {tmp_path.name}")
+            sha256.update(hash_buf[:n])
+            pos += n
+        _count("mxd_hash_seconds_total", time.perf_counter() - started, phase="segments")
+
+    def _advance_hash() -> None:
+        with hash_lock:
+            while hashed[0] < count:
+                with lock:
+                    if hashed[0] not in done:
+                        return
+                pos = hashed[0] * SEGMENT_SIZE
+                _hash_range(pos, min(pos + SEGMENT_SIZE, total_size))
+                hashed[0] += 1
+
+    def _fetch(index: int) -> None:
+        # Segments already in flight when another fails still finish, so they count on resume.
+        if failed.is_set() or _cancel_event.is_set():
+            return
+        start = index * SEGMENT_SIZE
+        end = min(start + SEGMENT_SIZE, total_size) - 1
+        headers = {"Range": f"bytes={start}-{end}"}
+        if state["etag"]:
+            # A changed file comes back as 200 instead of 206 and forces a restart.
+            headers["If-Range"] = state["etag"]
+        with _session().get(source_url or url, stream=True, timeout=(10, 300), headers=headers) as r:
+            r.raise_for_status()
+            if r.status_code != 206:
+                raise RangeNotSupported(f"server ignored Range request or file changed (HTTP {r.status_code})")
+            with lock:
+                etag = _strong_etag(r)
+                if state["etag"] is None and etag:
+                    state["etag"] = etag
+                    _persist()
+                elif etag and etag != state["etag"]:
+                    raise RangeNotSupported("remote file changed (ETag mismatch)")
+            offset = start
+            live, live_time = False, 0.0  # live: feeding sha256 from the receive buffer
+            for chunk in _iter_body(r, _io_buffer(buf_size)):
+                if offset + len(chunk) > end + 1:
+                    raise IOError(f"Segment {index} returned more data than requested")
+                rest, pos = chunk, offset
+                while rest:
+                    n = os.pwrite(fd, rest, pos)
+                    rest, pos = rest[n:], pos + n
+                if live or hashed[0] == index:
+                    with hash_lock:
+                        if not live and hashed[0] == index:
+                            # Just became the frontier: catch up on what's written, then hash as it arrives.
+                            _hash_range(start, offset)
+                            live = True
+                        if live:
+                            started = time.perf_counter()
+                            sha256.update(chunk)
+                            live_time += time.perf_counter() - started
+                offset += len(chunk)
+                progress.update(len(chunk))
+                if _cancel_event.is_set():
+                    raise DownloadCancelled()
+        if offset != end + 1:
+            raise IOError(f"Segment {index} truncated (got {offset - start}, expected {end + 1 - start})")
+        if live:
+            _count("mxd_hash_seconds_total", live_time, phase="stream")
+            # Marked done and hashed together, so _advance_hash never reads it back.
+            with hash_lock:
+                with lock:
+                    done.add(index)
+                    _persist()
+                hashed[0] += 1
+        else:
+            with lock:
+                done.add(index)
+                _persist()
+        _advance_hash()
+
+    try:
+        with ThreadPoolExecutor(max_workers=min(SEGMENT_WORKERS, len(pending) or 1),
+                                thread_name_prefix="mxd-seg") as pool:
+            futures = [pool.submit(_fetch, i) for i in pending]
+            for fut in as_completed(futures):
+                try:
+                    fut.result()
+                except Exception:
+                    failed.set()
+                    raise
+        if _cancel_event.is_set():
+            raise DownloadCancelled()
+        # Segments finished in an earlier attempt still need to be hashed.
+        _advance_hash()
+    finally:
+        os.close(fd)
+        progress.close()
+
+    if hashed[0] != count:
+        raise IOError(f"Not all segments of {tmp_path.name} were hashed")
+    return total_size, sha256.hexdigest()
+
+def _download_stream(r, url: str, tmp_path: Path, state: dict, start_byte: int,
+                     show_progress: bool = True, name: str | None = None) -> tuple[int, str]:
     """
-    Performs a single download attempt, using tqdm for the progress bar.
+    Writes an open GET response to the .part file. When `start_byte` > 0 the
+    request asked to resume there with Range + If-Range; if the server ignored
+    that, the download restarts from zero. Returns (size, sha256 hex digest).
     """
-    range_header, mode, start_byte = {}, "wb", 0
-    if resume and tmp_path.exists():
-        start_byte = tmp_path.stat().st_size
-        if start_byte > 0:
-            range_header = {"Range": f"bytes={start_byte}-"}
-            mode = "ab"
-
-    with requests.get(url, stream=True, timeout=(10, 300), headers=range_header) as r:
+    if start_byte and (r.status_code != 206 or _strong_etag(r) not in (None, state["etag"])):
+        log(f"   ⚠️ Can't resume {tmp_path.name} (server ignored Range or file changed). Restarting.")
+        start_byte = 0
+    if not start_byte:
+        _clear_partial(tmp_path)
+        state = {"mode": "stream", "url": url, "etag": _strong_etag(r), "length": 0}
+    total_size = int(r.headers.get("Content-Length", 0))
+
+    # Reuse this process's hasher if it is exactly at the resume point.
+    length, sha256 = _stream_hashers.pop(tmp_path, (None, None))
+    if length != start_byte:
+        sha256 = hashlib.sha256()
+        if start_byte:
+            _hash_prefix(sha256, tmp_path, start_byte)
+
+    written = start_byte
+    # Unbuffered: each large chunk goes to the kernel in one write() call.
+    with open(tmp_path, "r+b" if start_byte else "wb", buffering=0) as f:
+        f.truncate(start_byte)
+        if total_size:
+            _preallocate(f.fileno(), start_byte + total_size)
+        f.seek(start_byte)
+        progress = _FileProgress(name or tmp_path.name, total_size + start_byte if total_size else None,
+                                 initial=start_byte, show_bar=show_progress, bar_label=tmp_path.name)
+        next_checkpoint = written + CHECKPOINT_BYTES
+        hash_time = 0.0
+        try:
+            for chunk in _iter_body(r, _io_buffer(_io_buffer_size(tmp_path))):
+                started = time.perf_counter()
+                sha256.update(chunk)
+                hash_time += time.perf_counter() - started
+                rest = chunk
+                while rest:
+                    rest = rest[f.write(rest):]
+                written += len(chunk)
+                progress.update(len(chunk))
+                if written >= next_checkpoint and state["etag"]:
+                    f.flush()
+                    state["length"] = written
+                    _save_sidecar(tmp_path, state)
+                    next_checkpoint = written + CHECKPOINT_BYTES
+                if _cancel_event.is_set():
+                    raise DownloadCancelled()
+        finally:
+            progress.close()
+            _count("mxd_hash_seconds_total", hash_time, phase="stream")
+            # Everything written so far came from complete chunks, so it is valid.
+            if state["etag"] and written < total_size + start_byte:
+                f.flush()
+                state["length"] = written
+                _save_sidecar(tmp_path, state)
+                _stream_hashers[tmp_path] = (written, sha256)
+
+    if total_size != 0 and written != total_size + start_byte and not TEST_MODE:
+        raise IOError(f"Connection ended early (got {written}, expected {total_size + start_byte})")
+
+    return written, sha256.hexdigest()
+
+def _download_once(url: str, tmp_path: Path, show_progress: bool = True,
+                   segmented: bool = True, name: str | None = None) -> tuple[int, str]:
+    """
+    Performs a single download attempt, resuming any valid .part left behind.
+    The file size comes from the GET response itself (no separate HEAD); large
+    files on servers that honour Range are then fetched in parallel segments.
+    The SHA256 is computed while the bytes stream in.
+    Returns (size, sha256 hex digest).
+    """
+    segmented = segmented and SEGMENT_WORKERS > 1
+    state = _load_sidecar(tmp_path, url)
+
+    if segmented and state.get("mode") == "segments":
+        try:
+            return _download_segmented(url, tmp_path, state["size"], show_progress=show_progress, name=name)
+        except RangeNotSupported as e:
+            log(f"   ⚠️ {e}. Falling back to a single stream.")
+            _clear_partial(tmp_path)
+            return _download_once(url, tmp_path, show_progress=show_progress, segmented=False, name=name)
+
+    start_byte = 0
+    if state.get("mode") == "stream" and state.get("etag"):
+        start_byte = min(state.get("length", 0), tmp_path.stat().st_size)
+
+    # An open-ended Range reports the full size and whether ranges work in one go.
+    headers = {"Range": f"bytes={start_byte}-"}
+    if start_byte:
+        headers["If-Range"] = state["etag"]
+
+    with _session().get(url, stream=True, timeout=(10, 300), headers=headers) as r:
+        if start_byte and r.status_code == 416:
+            _clear_partial(tmp_path)
+            raise IOError(f"Saved progress for {tmp_path.name} is past the end of the remote file")
         r.raise_for_status()
-        total_size = int(r.headers.get("Content-Length", 0))
-
-        with open(tmp_path, mode) as f:
-            if show_progress:
-                # This block runs only when show_progress is True
-                with tqdm(
-                    desc=f"   DETAIL:: {tmp_path.name}",
-                    total=total_size, initial=start_byte, unit='B', unit_scale=True,
-                    unit_divisor=1024, mininterval=PROG_INT, ncols=80, ascii=" #",
-                    bar_format='{l_bar}{bar:25}{r_bar}'
-                ) as pbar:
-                    for chunk in r.iter_content(chunk_size=CHUNK):
-                        f.write(chunk)
-                        pbar.update(len(chunk))
-            else:
-                # This block runs when show_progress is False, downloading silently
-                for chunk in r.iter_content(chunk_size=CHUNK):
-                    f.write(chunk)
+        total_size = _total_size(r)
+        if total_size and total_size > 5_000_000_000 and not start_byte:
+            size_in_gb = round(total_size / 1_073_741_824, 2)
+            log(f"   -> Note: This is a large file ({size_in_gb} GB) and may take several minutes.")
+
+        if not (segmented and not start_byte and r.status_code == 206
+                and total_size and total_size >= SEGMENT_THRESHOLD):
+            return _download_stream(r, url, tmp_path, state, start_byte, show_progress=show_progress, name=name)
+        source_url = r.url
+
+    try:
+        return _download_segmented(url, tmp_path, total_size, show_progress=show_progress,
+                                   source_url=source_url, name=name)
+    except RangeNotSupported as e:
+        log(f"   ⚠️ {e}. Falling back to a single stream.")
+        _clear_partial(tmp_path)
+        return _download_once(url, tmp_path, show_progress=show_progress, segmented=False, name=name)
+
+# ── Download Sources ─────────────────────────────────────────────────────────
+# Sources that failed (connection error, 5xx) are skipped until this many seconds pass,
+# unless no other source is left to try.
+SOURCE_COOLDOWN = 60
+_source_down_until: dict[str, float] = {}
+_source_checked: dict[str, float] = {}
+
+def _source_dir(source: str) -> Path | None:
+    """The directory for a local-directory source, or None for HTTP sources."""
+    if source == "hf" or source.startswith(("http://", "https://")):
+        return None
+    return Path(source[len("file://"):] if source.startswith("file://") else source)
+
+def _source_url(source: str, remote_path: str) -> str:
+    base = BASE_URL if source == "hf" else source.rstrip("/")
+    return f"{base}/{remote_path}"
 
-    final_size = tmp_path.stat().st_size
-    if total_size != 0 and final_size != total_size + start_byte and not TEST_MODE:
-         raise IOError(f"Corrupted download: size mismatch (got {final_size}, expected {total_size + start_byte})")
+def _mark_down(source: str, reason) -> None:
+    _source_down_until[source] = time.monotonic() + SOURCE_COOLDOWN
+    _count("mxd_source_errors_total", source=source)
+    log(f"   ⚠️ Source {source} unavailable ({reason}). Failing over for {SOURCE_COOLDOWN}s.")
+
+def _source_healthy(source: str) -> bool:
+    """Cheap health check: cooldown after failures, plus a reachability probe per minute."""
+    if time.monotonic() < _source_down_until.get(source, 0):
+        return False
+    directory = _source_dir(source)
+    if directory is not None:
+        return directory.is_dir()
+    if source == "hf" or time.monotonic() - _source_checked.get(source, 0) < SOURCE_COOLDOWN:
+        return True
+    try:
+        r = _session().head(source.rstrip("/") + "/", timeout=5, allow_redirects=False)
+        healthy = r.status_code < 500
+    except requests.RequestException as e:
+        healthy, r = False, e
+    _source_checked[source] = time.monotonic()
+    if not healthy:
+        _mark_down(source, r)
+    return healthy
+
+def _usable_sources() -> list[str]:
+    """
+    Healthy sources in SOURCES order. If every source is cooling down, the one
+    that failed longest ago is retried rather than failing the file outright.
+    """
+    healthy = [source for source in SOURCES if _source_healthy(source)]
+    if healthy:
+        return healthy
+    now = time.monotonic()
+    cooling = [source for source in SOURCES if _source_down_until.get(source, 0) > now]
+    return [min(cooling, key=_source_down_until.get)] if cooling else []
+
+def _copy_from_dir(src: Path, tmp_path: Path, show_progress: bool, name: str) -> tuple[int, str]:
+    """Copies a cached file into the .part, hashing as it goes. Returns (size, sha256)."""
+    size = src.stat().st_size
+    progress = _FileProgress(name, size, show_bar=show_progress, bar_label=tmp_path.name)
+    sha256 = hashlib.sha256()
+    buf = _io_buffer(_io_buffer_size(tmp_path))
+    written, hash_time = 0, 0.0
+    try:
+        with open(src, "rb", buffering=0) as fin, open(tmp_path, "wb", buffering=0) as fout:
+            _preallocate(fout.fileno(), size)
+            while n := fin.readinto(buf):
+                started = time.perf_counter()
+                sha256.update(buf[:n])
+                hash_time += time.perf_counter() - started
+                rest = buf[:n]
+                while rest:
+                    rest = rest[fout.write(rest):]
+                written += n
+                progress.update(n)
+                if _cancel_event.is_set():
+                    raise DownloadCancelled()
+            fout.truncate(written)
+    finally:
+        progress.close()
+        _count("mxd_hash_seconds_total", hash_time, phase="copy")
+    return written, sha256.hexdigest()
+
+def _cached_file(directory: Path, remote_path: str, sha256: str) -> Path | None:
+    """A cache hit by remote path, or by hash in a blob-store layout."""
+    for candidate in (directory / remote_path, directory / "sha256" / sha256[:2] / sha256):
+        if candidate.is_file():
+            return candidate
+    return None
+
+def _record_transfer(name: str, source: str, elapsed: float) -> None:
+    """Accounts the bytes one source attempt moved for `name` and how long it took."""
+    with _transferred_lock:
+        moved = _transferred.pop(name, 0)
+    if not moved:
+        return
+    _count("mxd_download_bytes_total", moved, source=source)
+    _count("mxd_transfer_seconds_total", elapsed, source=source)
+    rate = moved / max(elapsed, 1e-6)
+    _observe("mxd_file_rate_bytes_per_second", rate, RATE_BUCKETS, source=source)
+    _gauge("mxd_file_last_rate_bytes_per_second", round(rate), file=name, source=source)
+
+def _fetch_from_sources(remote_path: str, tmp_path: Path, expected_sha256: str,
+                        show_progress: bool, name: str) -> tuple[int, str]:
+    """
+    Tries each healthy source in SOURCES order and returns (size, source) for the
+    first one that yields a file with the expected SHA256 in tmp_path.
+    """
+    expected = expected_sha256.lower()
+    last_error: Exception = IOError("no download source is available")
+    for source in _usable_sources():
+        with _transferred_lock:
+            _transferred.pop(name, None)
+        started = time.monotonic()
+        try:
+            directory = _source_dir(source)
+            if directory is not None:
+                cached = _cached_file(directory, remote_path, expected)
+                if cached is None:
+                    continue
+                _clear_partial(tmp_path)
+                size, digest = _copy_from_dir(cached, tmp_path, show_progress, name)
+            else:
+                size, digest = _download_once(_source_url(source, remote_path), tmp_path,
+                                              show_progress=show_progress, name=name)
+        except DownloadCancelled:
+            raise
+        except requests.HTTPError as e:
+            last_error = e
+            if e.response is not None and e.response.status_code in (403, 404, 410):
+                continue  # this source doesn't have the file; try the next one
+            _mark_down(source, e)
+            continue
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError) as e:
+            last_error = e
+            _mark_down(source, e)
+            continue
+        finally:
+            _record_transfer(name, source, time.monotonic() - started)
+        if digest.lower() == expected:
+            return size, source
+        _clear_partial(tmp_path)
+        last_error = CorruptDownload(f"Corrupted download from {source} - SHA256 mismatch.")
+        # One bad file says little about the source, so it isn't put on cooldown.
+        _count("mxd_source_errors_total", source=source)
+        log(f"   ⚠️ SHA256 mismatch for {name} from {source}. Trying the next source.")
+    raise last_error
 
-    return final_size
+def _write_back(source: str, remote_path: str, local_path: Path) -> None:
+    """Stores a freshly fetched file in the first local-directory source, if enabled."""
+    if not CACHE_WRITE_BACK or _source_dir(source) is not None:
+        return
+    cache = next((d for d in map(_source_dir, SOURCES) if d is not None), None)
+    if cache is None:
+        return
+    dest = cache / remote_path
+    if dest.exists():
+        return
+    tmp = dest.with_name(f"{dest.name}.{os.getpid()}.tmp")
+    try:
+        dest.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            os.link(local_path, tmp)
+        except OSError:
+            shutil.copyfile(local_path, tmp)
+        os.replace(tmp, dest)
+        log(f"   💾 Cached {local_path.name} in {cache}")
+    except OSError as e:
+        tmp.unlink(missing_ok=True)
+        log(f"   ⚠️ Could not write {local_path.name} back to {cache}: {e}")
 
 # ── Download Wrapper Function ────────────────────────────────────────────────
 
@@ -187,67 +1181,190 @@ def _download_once(url: str, tmp_path: Path, resume: bool = False, show_progress
 def download(remote_path: str, local_path: Path, expected_sha256: str, show_progress: bool = True) -> None:
     """
     Main download wrapper with retries, resume, and hash checking.
+    A hash already in the blob store is linked into place instead of downloaded.
     """
     local_path.parent.mkdir(parents=True, exist_ok=True)
-    
-    # 1. Pre-download check
+    try:
+        with _blob_lock(expected_sha256):
+            _download_locked(remote_path, local_path, expected_sha256, show_progress)
+    finally:
+        flush_metrics()
+
+def _download_locked(remote_path: str, local_path: Path, expected_sha256: str, show_progress: bool) -> None:
+    # 1. Pre-download check (trust the manifest unless --deep-verify)
     if local_path.exists():
-        local_hash = _get_local_sha256(local_path)
+        if not DEEP_VERIFY and _manifest_lookup(local_path) == expected_sha256.lower():
+            _adopt_into_blob(local_path, expected_sha256)
+            log(f"INFO:: ✅ Skipping {local_path.name} (Verified earlier, unchanged).")
+            _emit(ProgressEvent(local_path.name, "skipped"))
+            return
+        # A cut-short file fails the hash anyway; the header says so without reading 20 GB.
+        local_hash = None if _safetensors_truncated(local_path) else _get_local_sha256(local_path)
         if local_hash and local_hash.lower() == expected_sha256.lower():
+            _manifest_update(local_path, local_hash)
+            _adopt_into_blob(local_path, expected_sha256)
             # This line is fine, it only runs when skipping.
             log(f"INFO:: ✅ Skipping {local_path.name} (Hash Matches).")
+            _emit(ProgressEvent(local_path.name, "skipped"))
             return
         else:
             log(f"⚠️ Hash mismatch for {local_path.name}. Re-downloading.")
+            _manifest_update(local_path, None)
             local_path.unlink()
 
-    # 2. Download loop
-    url = f"{BASE_URL}/{remote_path}"
+    # 2. Same content already stored under another name (or a shared cache)?
+    if _blob_ready(expected_sha256):
+        _link_from_blob(expected_sha256, local_path)
+        _manifest_update(local_path, expected_sha256)
+        log(f"INFO:: ✅ Linked {local_path.name} from the blob store (no download needed).")
+        _emit(ProgressEvent(local_path.name, "skipped"))
+        return
 
-    try:
-        size_in_bytes = _remote_size(url)
-        # Set a threshold, e.g., 1 GB (1,000,000,000 bytes)
-        if size_in_bytes and size_in_bytes > 5_000_000_000:
-            size_in_gb = round(size_in_bytes / 1_073_741_824, 2)
-            log(f"   -> Note: This is a large file ({size_in_gb} GB) and may take several minutes.")
-    except Exception:
-        # If size check fails, just continue without the warning.
-        pass
-    
+    # 3. Download loop (sources are tried in SOURCES order)
     tmp_path = local_path.with_suffix(".part")
 
     
     for attempt in range(1, RETRIES + 1):
+        if _cancel_event.is_set():
+            _emit(ProgressEvent(local_path.name, "cancelled"))
+            return
         try:
             # The old "Downloading..." log message that interfered with the UI is removed.
             
             # The `show_progress` flag is correctly passed down now.
-            _download_once(url, tmp_path, resume=tmp_path.exists(), show_progress=show_progress)
-            
-            # 3. Post-download verification
-            final_hash = _get_local_sha256(tmp_path)
-            if final_hash and final_hash.lower() == expected_sha256.lower():
-                tmp_path.rename(local_path)
-                log(f"INFO:: ✅ Verified: {local_path.name}")
-                return # Success
-            else:
-                raise IOError("Corrupted download - SHA256 mismatch.")
-        
+            # 4. Verification happens per source (the hash is computed during the transfer)
+            size, source = _fetch_from_sources(remote_path, tmp_path, expected_sha256,
+                                               show_progress, local_path.name)
+            final_hash = expected_sha256.lower()
+            _store_verified(tmp_path, local_path, final_hash)
+            _clear_partial(tmp_path)
+            _manifest_update(local_path, final_hash)
+            log(f"INFO:: ✅ Verified: {local_path.name}")
+            _emit(ProgressEvent(local_path.name, "done", size, size))
+            _write_back(source, remote_path, local_path)
+            return # Success
+
+        except DownloadCancelled:
+            log(f"   🟥 Cancelled {local_path.name}. Progress is kept in {tmp_path.name} for next time.")
+            _emit(ProgressEvent(local_path.name, "cancelled"))
+            return
+
         except Exception as e:
             log(f"   ⚠️ Download failed on attempt {attempt}: {e}")
-            if tmp_path.exists():
+            # Only a corrupt result is thrown away; otherwise the .part and its
+            # sidecar stay so the next attempt (or next run) resumes.
+            if isinstance(e, CorruptDownload):
                 try: 
-                    tmp_path.unlink()
+                    _clear_partial(tmp_path)
                 except OSError as err: 
                     log(f"   ⚠️ Could not delete .part file: {err}")
             
             if attempt < RETRIES:
+                _count("mxd_download_retries_total")
                 time.sleep(2 * 2**attempt)
             else:
                 log(f"   ❌ Giving up on {local_path.name} after {RETRIES} attempts.")
                 FAILED_FILES.append((remote_path, str(local_path)))
+                _emit(ProgressEvent(local_path.name, "failed"))
+
+async def download_all_async(queue, max_workers: int = MAX_WORKERS, show_progress: bool = True) -> None:
+    """
+    Asyncio download engine: one task per (remote, local, sha256) entry, bounded
+    by a semaphore. The blocking transfers (requests + segment threads) run in a
+    dedicated thread pool of the same size. Per-file events are re-published with an aggregated
+    "OVERALL" event. Ctrl+C (or cancelling this coroutine) stops every transfer
+    at its next chunk with its .part checkpointed, instead of killing the process.
+    """
+    total = len(queue)
+    workers = max(1, min(max_workers, total or 1))
+    sem = asyncio.Semaphore(workers)
+    loop = asyncio.get_running_loop()
+    names = {Path(local).name for _, local, _ in queue}
+    files: dict[str, ProgressEvent] = {}
+    files_lock = threading.Lock()
+
+    def _overall(event: ProgressEvent) -> None:
+        if event.name not in names:
+            return
+        # Published under the lock: two files finishing together must not deliver
+        # their OVERALL events out of order and leave a stale count as the last word.
+        with files_lock:
+            files[event.name] = event
+            snapshot = list(files.values())
+            finished = sum(e.state in ("done", "skipped", "failed", "cancelled") for e in snapshot)
+            active = [e for e in snapshot if e.state == "downloading"]
+            rate = sum(e.rate for e in active)
+            state = "done" if finished == total else "downloading"
+            _emit(ProgressEvent("OVERALL", state, sum(e.bytes_done for e in snapshot), None, rate, None,
+                                files_done=finished, files_total=total))
+
+    async def _one(i, remote, local, sha256):
+        async with sem:
+            if _cancel_event.is_set():
+                return
+            log(f"\n--- File {i}/{total}: {Path(local).name} ---")
+            await loop.run_in_executor(pool, download, remote, MODEL_DIR / local, sha256, show_progress)
+
+    def _on_sigint() -> None:
+        global user_cancelled
+        user_cancelled = True
+        _cancel_event.set()
+        _orig_stdout.write("\n🟥 Cancelling downloads. Partial downloads are kept and will resume.\n")
+        _orig_stdout.flush()
+
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="mxd-dl")
+    state_file = _ProgressStateFile(Path(PROGRESS_FILE)) if PROGRESS_FILE else None
+    unsubscribe_state = subscribe(state_file) if state_file else (lambda: None)
+    unsubscribe = subscribe(_overall)
+    try:
+        loop.add_signal_handler(signal.SIGINT, _on_sigint)
+        handles_sigint = True
+    except (NotImplementedError, RuntimeError, ValueError):
+        handles_sigint = False  # not the main thread / not supported here
+    try:
+        for _, local, _ in queue:
+            _emit(ProgressEvent(Path(local).name, "queued"))
+        tasks = [asyncio.create_task(_one(i, *entry)) for i, entry in enumerate(queue, 1)]
+        try:
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+        except asyncio.CancelledError:
+            _cancel_event.set()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+        for (remote, _, _), result in zip(queue, results):
+            if isinstance(result, Exception):
+                log(f"   ❌ Unexpected error while downloading {remote}: {result}")
+                FAILED_FILES.append((remote, f"unexpected error: {result}"))
+    finally:
+        unsubscribe()
+        pool.shutdown(wait=True)
+        unsubscribe_state()
+        if state_file:
+            state_file.close()
+        if handles_sigint:
+            loop.remove_signal_handler(signal.SIGINT)
+            signal.signal(signal.SIGINT, handle_interrupt)
+
+def download_many(queue, max_workers: int = MAX_WORKERS, show_progress: bool = True) -> None:
+    """
+    Synchronous wrapper around download_all_async() for the installer scripts.
+    Failures are collected into FAILED_FILES by download() itself. Exits with
+    status 130 once in-flight transfers have checkpointed if the user cancelled.
+    """
+    asyncio.run(download_all_async(queue, max_workers=max_workers, show_progress=show_progress))
+    if _cancel_event.is_set():
+        sys.exit(130)
 
 # ── Model File Lists ────────────────────────────────────────────────────────
+# Download priority by model folder: every graph needs the text encoders and
+# VAE, then a UNET; the rest (upscalers, detectors, LoRAs...) only some graphs use.
+MODEL_TIERS = {"clip": 0, "vae": 0, "diffusion_models": 1}
+EXTRAS_TIER = 2
+TIER_NAMES = ("text_encoders_vae", "unet", "extras")
+
+def model_tier(local_rel_path: str) -> int:
+    return MODEL_TIERS.get(local_rel_path.split("/", 1)[0], EXTRAS_TIER)
+
 def get_model_files(schnell: bool = False):
     """
     Returns a hardcoded list of the highest-quality models for RunPod.
@@ -293,6 +1410,67 @@ def get_model_files(schnell: bool = False):
     ]
     return files + always_download
 
+# ── Staged Downloads ────────────────────────────────────────────────────────
+# Records which tiers are usable, so ComfyUI can be used while the rest lands:
+# {"updated", "ready", "tiers": {name: {"state": pending|downloading|ready|failed|cancelled, "files"}}}
+READY_FILE = Path(os.environ.get("MXD_READY_FILE", "/workspace/logs/mxd_ready.json"))
+
+def _write_ready(tiers: dict) -> None:
+    data = {"updated": time.time(), "ready": all(t["state"] == "ready" for t in tiers.values()), "tiers": tiers}
+    tmp = READY_FILE.with_name(f"{READY_FILE.name}.{os.getpid()}.tmp")
+    try:
+        READY_FILE.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_text(json.dumps(data))
+        os.replace(tmp, READY_FILE)
+    except OSError as e:
+        log(f"⚠️  Could not write readiness to {READY_FILE}: {e}")
+
+def download_by_tier(queue, max_workers: int = MAX_WORKERS, show_progress: bool = True) -> None:
+    """
+    One download_many() pass over `queue` sorted by model_tier(), so text encoders
+    and VAE start first, then UNETs, then upscalers and detectors, while every
+    worker slot stays busy. Each tier's state is worked out from the per-file
+    events and published to READY_FILE as soon as it changes.
+    """
+    queue = sorted(queue, key=lambda f: model_tier(f[1]))
+    tier_of = {Path(local).name: TIER_NAMES[model_tier(local)] for _, local, _ in queue}
+    tiers: dict[str, dict] = {}
+    remaining: dict[str, set] = {}
+    for name, tier in tier_of.items():
+        tiers.setdefault(tier, {"state": "pending", "files": []})["files"].append(name)
+        remaining.setdefault(tier, set()).add(name)
+    problems: dict[str, str] = {}
+    lock = threading.Lock()
+
+    def _track(event: ProgressEvent) -> None:
+        tier = tier_of.get(event.name)
+        if tier is None:
+            return
+        with lock:
+            before = tiers[tier]["state"]
+            if event.state in ("done", "skipped", "failed", "cancelled"):
+                remaining[tier].discard(event.name)
+                if event.state in ("failed", "cancelled") and problems.get(tier) != "failed":
+                    problems[tier] = event.state
+                if not remaining[tier]:
+                    tiers[tier]["state"] = problems.get(tier, "ready")
+            elif event.state == "downloading" and before == "pending":
+                tiers[tier]["state"] = "downloading"
+            if tiers[tier]["state"] != before:
+                _write_ready(tiers)
+
+    _write_ready(tiers)
+    unsubscribe = subscribe(_track)
+    try:
+        download_many(queue, max_workers=max_workers, show_progress=show_progress)
+    finally:
+        unsubscribe()
+        # Files that ended without an event (an unexpected error, or never started).
+        for tier, names in remaining.items():
+            if names:
+                tiers[tier]["state"] = "cancelled" if _cancel_event.is_set() else "failed"
+        _write_ready(tiers)
+
 # ── Main Execution ──────────────────────────────────────────────────────────
 def main():
     """Main execution block."""
@@ -324,6 +1502,8 @@ def main():
     log(f"=== FLUX Automated Installer Log ({time.strftime('%Y-%m-%d %H:%M:%S')}) ===")
     if TEST_MODE:
         log("🧪 TEST MODE ENABLED: Downloads will stop after 1 MB.")
+    if DEEP_VERIFY:
+        log("🔍 DEEP VERIFY ENABLED: Existing files will be fully re-hashed.")
     
     # --- Install Dependencies ---
     log("\n--- Installing Dependencies ---")
@@ -334,18 +1514,16 @@ def main():
     # --- Download Models ---
     log("\n--- Downloading Models ---")
     try:
-        requests.head("https://huggingface.co", timeout=10)
+        # Goes through the shared session so the first download reuses this connection.
+        _session().head("https://huggingface.co", timeout=10)
     except Exception:
         log("❌ No outbound connection to Hugging Face. Check your internet/firewall.")
         sys.exit(1)
     
     queue = get_model_files(schnell=DOWNLOAD_SCHNELL)
     total = len(queue)
-    log(f"🟢 Download queue contains {total} files. Starting...")
-
-    for i, (repo, local, sha256) in enumerate(queue, 1):
-        log(f"\n--- File {i}/{total} ---")
-        download(repo, MODEL_DIR / local, sha256)
+    log(f"🟢 Download queue contains {total} files. Starting ({MAX_WORKERS} at a time)...")
+    download_many(queue)
 
     # --- Final Summary ---
     log("\n\n=================> MEGA FLUX INSTALLER COMPLETE <=================\n")
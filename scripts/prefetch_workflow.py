@@ -0,0 +1,105 @@
+# ─── Imports ────────────────────────────────────────────────────────────────
+import sys, json
+from pathlib import Path
+from install_maxedout import download_by_tier, get_model_files, model_tier, FAILED_FILES, MAX_WORKERS
+
+# ─── Settings ───────────────────────────────────────────────────────────────
+# Usage: python3 prefetch_workflow.py "Flux Bootcamp (Level 1).json" [more.json ...] [--dry-run]
+# Downloads only the models the given workflows reference, instead of the full core set.
+WORKFLOW_DIR = Path("/workspace/ComfyUI/user/default/workflows")
+MODEL_EXTENSIONS = (".safetensors", ".sft", ".pth", ".pt", ".ckpt", ".bin", ".onnx", ".gguf")
+DRY_RUN = "--dry-run" in sys.argv
+
+# ─── Workflow Parsing ───────────────────────────────────────────────────────
+def _strings(value):
+    """Every string inside a widget value (lists and dicts are walked)."""
+    if isinstance(value, str):
+        yield value
+    elif isinstance(value, list):
+        for item in value:
+            yield from _strings(item)
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _strings(item)
+
+def workflow_values(workflow: dict):
+    """
+    Widget values of every node. Handles the UI format (nodes + widgets_values,
+    including subgraph definitions) and the API format ({id: {class_type, inputs}}).
+    Bypassed and muted nodes are included: they're one click from being used.
+    """
+    if "nodes" in workflow:
+        nodes = list(workflow["nodes"])
+        for subgraph in (workflow.get("definitions") or {}).get("subgraphs", []):
+            nodes.extend(subgraph.get("nodes", []))
+        for node in nodes:
+            yield from _strings(node.get("widgets_values"))
+    else:
+        for node in workflow.values():
+            if isinstance(node, dict) and "class_type" in node:
+                yield from _strings(node.get("inputs"))
+
+def referenced_models(workflow: dict) -> list[str]:
+    """Model file names the workflow points at, e.g. "bbox/face_yolov8m.pt", in first-seen order."""
+    names = []
+    for value in workflow_values(workflow):
+        name = value.strip().replace("\\", "/")
+        if name.lower().endswith(MODEL_EXTENSIONS) and name not in names:
+            names.append(name)
+    return names
+
+# ─── Dependency Resolution ──────────────────────────────────────────────────
+def resolve(workflows: list[dict], catalog=None):
+    """
+    Maps the referenced file names onto catalog entries (matched against the end
+    of each entry's local path, the way ComfyUI's loaders name them). Returns the
+    download queue, deduplicated and in priority order, plus the names no entry matched.
+    """
+    catalog = catalog if catalog is not None else get_model_files(schnell=True)
+    queue, unresolved, seen = [], [], set()
+    for workflow in workflows:
+        for name in referenced_models(workflow):
+            matches = [f for f in catalog if f[1] == name or f[1].endswith("/" + name)]
+            if not matches and name not in unresolved:
+                unresolved.append(name)
+            for entry in matches:
+                if entry[1] not in seen:
+                    seen.add(entry[1])
+                    queue.append(entry)
+    queue.sort(key=lambda f: model_tier(f[1]))
+    return queue, unresolved
+
+def load_workflow(arg: str) -> dict:
+    """Loads a workflow by path, or by name from ComfyUI's workflow folder."""
+    path = Path(arg)
+    if not path.exists() and (WORKFLOW_DIR / arg).exists():
+        path = WORKFLOW_DIR / arg
+    with open(path, encoding="utf8") as f:
+        return json.load(f)
+
+# ─── Main Function ──────────────────────────────────────────────────────────
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    if not args:
+        print(f"Usage: {Path(sys.argv[0]).name} WORKFLOW.json [...] [--dry-run]")
+        sys.exit(2)
+
+    queue, unresolved = resolve([load_workflow(a) for a in args])
+    print(f"--- Prefetching models for {len(args)} workflow(s) ---")
+    for _, local, _ in queue:
+        print(f"   ↳ {local}")
+    for name in unresolved:
+        print(f"⚠️ {name} is not in the model catalog; add it to models/ yourself.")
+    if DRY_RUN or not queue:
+        return
+
+    print(f"Downloading {len(queue)} files, {MAX_WORKERS} at a time...")
+    download_by_tier(queue, show_progress=False)
+
+    for remote, reason in FAILED_FILES:
+        print(f"❌ Failed: {remote} ({reason})")
+    print("--- Workflow Prefetch Complete ---")
+
+# ─── Entry Point ────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    main()
@@ -42,19 +42,11 @@ export PYTHONPATH="/workspace/scripts:${PYTHONPATH}"
 
 echo "🔥 STARTING FLUX V1 @ $(date) — Commit: $(git rev-parse HEAD 2>/dev/null || echo unknown)"
 
-# 📦 Install core models once
-INSTALL_LOCK="/workspace/.flux_installed"
-
-if [ ! -f "$INSTALL_LOCK" ]; then
-    echo "⬇️  Downloading core FLUX models..."
-    python3 /workspace/scripts/download_core_models.py
-    touch "$INSTALL_LOCK"
-else
-    echo "✅ Core FLUX models already installed. Skipping download."
-fi
-
 # 🔐 Start Patreon unlock server
-echo "🔐 Starting Patreon unlock server..."
+# AUTH_SERVER=waitress (threaded production server) or dev (Flask's built-in server)
+export AUTH_SERVER="${AUTH_SERVER:-waitress}"
+export AUTH_THREADS="${AUTH_THREADS:-16}"
+echo "🔐 Starting Patreon unlock server (${AUTH_SERVER})..."
 python3 -u /workspace/auth/app.py > /workspace/unlock.log 2>&1 &
 sleep 2
 
@@ -64,6 +56,26 @@ python3 /workspace/ComfyUI/main.py --listen 0.0.0.0 --port 8188 > /workspace/com
 COMFYUI_PID=$!
 sleep 2
 
+# 📦 Install core models once, in the background so the UI is usable right away.
+# Files start in priority order (text encoders/VAE, then the UNET, then upscalers/detectors);
+# /workspace/logs/mxd_ready.json (or the unlock server's /ready) says which are done.
+INSTALL_LOCK="/workspace/.flux_installed"
+MODEL_DOWNLOAD_LOG="/workspace/logs/model_download.log"
+mkdir -p /workspace/logs
+
+# PREFETCH_WORKFLOW="Flux Bootcamp (Level 1).json" pulls only that workflow's models
+# (checked on every boot; files already verified are skipped instantly).
+if [ -n "$PREFETCH_WORKFLOW" ]; then
+    echo "⬇️  Downloading models for workflow in the background: ${PREFETCH_WORKFLOW} (log: ${MODEL_DOWNLOAD_LOG})"
+    python3 -u /workspace/scripts/prefetch_workflow.py "$PREFETCH_WORKFLOW" > "$MODEL_DOWNLOAD_LOG" 2>&1 &
+elif [ ! -f "$INSTALL_LOCK" ]; then
+    echo "⬇️  Downloading core FLUX models in the background (log: ${MODEL_DOWNLOAD_LOG})..."
+    # The lock is only written once every file is in, so an interrupted boot resumes next time.
+    ( python3 -u /workspace/scripts/download_core_models.py && touch "$INSTALL_LOCK" ) > "$MODEL_DOWNLOAD_LOG" 2>&1 &
+else
+    echo "✅ Core FLUX models already installed. Skipping download."
+fi
+
 # ─── JUPYTER STARTUP ───────────────────────────────────────────
 echo "🚀 Starting JupyterLab..."
 